@@ -13,12 +13,26 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <https://www.gnu.org/licenses/>.
 
+import sys
 import bpy
-from .ui import POLYBLOCKER_MT_pie, POLYBLOCKER_AP_preferences
-from .add_mesh import POLYBLOCKER_OT_add_mesh, POLYBLOCKER_OT_make_collection
-from .cap_tool import POLYBLOCKER_OT_cap_tool
-from .quick_mirror import POLYBLOCKER_OT_quick_mirror
-from .bump import POLYBLOCKER_OT_bump, POLYBLOCKER_OT_random_bumps
+from .ui import (
+    POLYBLOCKER_MT_pie,
+    POLYBLOCKER_AP_preferences,
+    draw_object_menu,
+    update_profiling,
+)
+from .operators import (
+    POLYBLOCKER_OT_add_mesh,
+    POLYBLOCKER_OT_add_primitive,
+    POLYBLOCKER_OT_fit_primitives,
+    POLYBLOCKER_OT_make_collection,
+    POLYBLOCKER_OT_cap_tool,
+    POLYBLOCKER_OT_quick_mirror,
+    POLYBLOCKER_OT_bump,
+    POLYBLOCKER_OT_random_bumps,
+)
+from .profiling import POLYBLOCKER_OT_dump_profile
+from . import instancing, registry
 
 
 bl_info = {
@@ -35,11 +49,14 @@ bl_info = {
 keymaps = []
 classes = (
     POLYBLOCKER_OT_add_mesh,
+    POLYBLOCKER_OT_add_primitive,
+    POLYBLOCKER_OT_fit_primitives,
     POLYBLOCKER_OT_make_collection,
     POLYBLOCKER_OT_cap_tool,
     POLYBLOCKER_OT_quick_mirror,
     POLYBLOCKER_OT_bump,
     POLYBLOCKER_OT_random_bumps,
+    POLYBLOCKER_OT_dump_profile,
     POLYBLOCKER_MT_pie,
     POLYBLOCKER_AP_preferences,
 )
@@ -48,6 +65,12 @@ classes = (
 def register():
     for cls in classes:
         bpy.utils.register_class(cls)
+    addon = bpy.context.preferences.addons.get(__package__)
+    if addon is not None:
+        update_profiling(addon.preferences, bpy.context)
+    instancing.register()
+    registry.register()
+    bpy.types.VIEW3D_MT_object.append(draw_object_menu)
     key_config = bpy.context.window_manager.keyconfigs.addon
     if key_config:
         keymap = key_config.keymaps.new("3D View", space_type="VIEW_3D")
@@ -72,6 +95,13 @@ def unregister():
     for keymap, keymap_item in keymaps:
         keymap.keymap_items.remove(keymap_item)
     keymaps.clear()
+    bpy.types.VIEW3D_MT_object.remove(draw_object_menu)
+    registry.unregister()
+    instancing.unregister()
+    # Random Bumps keeps its worker processes once it has run
+    bump = sys.modules.get(f"{__package__}.bump")
+    if bump is not None:
+        bump.shutdown_workers()
     for cls in reversed(classes):
         bpy.utils.unregister_class(cls)
 
@@ -2,181 +2,297 @@
 
 import bpy
 import bmesh
+import numpy as np
 from mathutils import Vector, Matrix
+from . import primitives, profiling, registry
+from .mesh_utils import connected_labels, face_islands, fit_rectangle, fit_rectangles
+
+EMPTY = np.empty((0, 3))
+EMPTY_EDGES = np.empty((0, 2, 3))
+EMPTY_FACES = {"normal": EMPTY, "area": np.empty(0), "center": EMPTY}
+# what read_selection gives for an edit mesh with nothing selected
+EMPTY_SELECTION = {
+    "verts": EMPTY,
+    "edges": EMPTY_EDGES,
+    "faces": EMPTY_FACES,
+    "linked_faces": EMPTY_FACES,
+    "vert_edge_lengths": np.empty(0),
+    "deselect": [],
+}
+
+# below this share of selected verts, the selection is read through the edit
+# mesh instead of syncing and reading the whole mesh
+SMALL_SELECTION = 0.05
+
+# selection frame of the last run, for the redo panel
+last_frame = {}
+
+
+def free_names(base, count):
+    """Names Blender would give count objects named base, without the renames"""
+    taken = set(bpy.data.objects.keys())
+    names = []
+    number = 0
+    name = base
+    while len(names) < count:
+        if name not in taken:
+            names.append(name)
+        number += 1
+        name = f"{base}.{number:03d}"
+    return names
+
+
+def move_to_collection(objs, target, sources=None):
+    """Move objs into target, out of sources or every collection they are in"""
+    if sources is None:
+        sources = [scene.collection for scene in bpy.data.scenes]
+        sources.extend(bpy.data.collections)
+    # users_collection searches every collection for each object, so go over
+    # the collections once instead
+    moving = set(objs)
+    in_target = set()
+    for collection in sources:
+        found = [o for o in collection.objects if o in moving]
+        if collection == target:
+            in_target.update(found)
+        else:
+            for obj in found:
+                collection.objects.unlink(obj)
+    for obj in objs:
+        if obj not in in_target:
+            target.objects.link(obj)
+    # every rename would search for a free name, so pick them all up front
+    for obj, name in zip(objs, free_names(target.name, len(objs))):
+        obj.name = name
 
 
-added = {}
-collections = {}
-
-
-def move_to_collection(obj, target):
-    for collection in obj.users_collection:
-        collection.objects.unlink(obj)
-    target.objects.link(obj)
-    obj.name = target.name
-
-
-class POLYBLOCKER_OT_add_mesh(bpy.types.Operator):
-    bl_idname = "polyblocker.add_mesh"
-    bl_label = "Add Mesh"
-    bl_description = "Add mesh"
-    bl_options = {"UNDO", "REGISTER"}
+def selection_key(context, edit_objs):
+    # changes whenever the selection frame could
+    key = [(context.object.name, tuple(context.object.dimensions))]
+    for o in edit_objs:
+        mesh = o.data
+        counts = (mesh.total_vert_sel, mesh.total_edge_sel, mesh.total_face_sel)
+        key.append((o.name, tuple(map(tuple, o.matrix_world)), counts))
+    return key
 
-    idx: bpy.props.IntProperty(options={"SKIP_SAVE"})
-    location: bpy.props.FloatVectorProperty(
-        subtype="TRANSLATION", description="Translate on local axes"
-    )
-    rotation: bpy.props.FloatVectorProperty(
-        subtype="EULER", description="Rotate on local axes"
-    )
-    scale: bpy.props.FloatVectorProperty(
-        default=(1, 1, 1), subtype="XYZ", description="Scale on local axes"
-    )
 
-    @classmethod
-    def poll(cls, context):
-        obj = context.object
-        return obj is not None and obj.mode == "EDIT" and obj.type == "MESH"
+class AddMesh:
+    """Implementation of polyblocker.add_mesh"""
 
     def execute(self, context):
         prefs = context.preferences.addons[__package__].preferences
-        obj = context.object
 
         # clear old properties
         if not self.options.is_repeat:
             self.location = (0, 0, 0)
             self.rotation = (0, 0, 0)
             self.scale = (1, 1, 1)
+            # a frame is only valid for redoing the run that made it
+            last_frame.clear()
 
         # get meshes in edit mode
-        meshes = []
-        for obj in bpy.data.objects:
-            if obj.mode == "EDIT":
-                meshes.append({"obj": obj})
-
-        # need to go into obj mode for transform
-        bpy.ops.object.mode_set(mode="OBJECT")
-        for mesh in meshes:
-            obj = mesh["obj"]
-            mesh["transform"] = obj.matrix_basis.copy()
-            # apply transform
-            obj.data.transform(obj.matrix_basis)
-            obj.matrix_basis.identity()
-
-            # make sure all edit meshes are selected
-            obj.select_set(True)
-
-        bpy.ops.object.mode_set(mode="EDIT")
-
-        # get selected geometry
-        s_verts = []
-        s_edges = []
-        s_faces = []
-        target_obj = None
-        max_verts = 0
-        for mesh in meshes:
-            bm = bmesh.from_edit_mesh(mesh["obj"].data)
-            mesh["bm"] = bm
-            verts = [v for v in bm.verts if v.select]
-            if prefs.auto_coll and len(verts) > max_verts:
-                # target mesh has the most selected verts
-                max_verts = len(verts)
-                target_obj = mesh["obj"]
-            s_verts.extend(verts)
-            s_edges.extend([e for e in bm.edges if e.select])
-
-            for f in bm.faces:
-                if f.select:
-                    s_faces.append(f)
-                    # deselect geometry
-                    f.select = False
+        edit_objs = [o for o in bpy.data.objects if o.mode == "EDIT"]
+        if self.islands:
+            return self.add_islands(context, prefs, edit_objs)
+
+        # the redo panel runs again on the same selection, so reuse its frame
+        key = selection_key(context, edit_objs)
+        if self.options.is_repeat and last_frame.get("key") == key:
+            frame = last_frame["frame"]
+            for edit_obj in edit_objs:
+                faces = frame["deselect"].get(edit_obj.name)
+                if faces:
+                    deselect_faces(edit_obj.data, faces)
+        else:
+            frame = self.selection_frame(context, prefs, edit_objs)
+            last_frame["key"] = key
+            last_frame["frame"] = frame
+        mesh_center = frame["center"]
+        mesh_normal = frame["normal"]
+        align_matrix = frame["align"]
+        size = frame["size"]
+        target_obj = bpy.data.objects.get(frame["target"] or "")
+
+        # autoscale
+        if not self.options.is_repeat:
+            for axis, ratio in frame["autoscale"].items():
+                setattr(self.scale, axis, ratio)
+
+        loc_vector, rotation = self.placement(mesh_center, mesh_normal, align_matrix)
+
+        # shared meshes stay out of edit mode, or they'd be split right away
+        share = prefs.share_meshes
+        collection = self.auto_collection(prefs, target_obj)
+        with profiling.phase("add_mesh.primitive"):
+            added_obj = primitives.add_primitive(
+                context,
+                self.idx,
+                size,
+                loc_vector,
+                rotation,
+                self.scale,
+                select=not share,
+                collection=collection,
+            )
+        if not share:
+            # keep every edit mesh in edit mode, the new one joins them
+            for edit_obj in edit_objs:
+                edit_obj.select_set(True)
+            with profiling.phase("add_mesh.mode_toggle"):
+                bpy.ops.object.mode_set(mode="EDIT")
+
+        if prefs.auto_coll:
+            self.auto_collect(prefs, target_obj, [added_obj])
+
+        return {"FINISHED"}
+
+    def selection_frame(self, context, prefs, edit_objs):
+        # get selected geometry in world space, read in bulk
+        with profiling.phase("add_mesh.selection_scan"):
+            selections = [read_selection(o) for o in edit_objs]
+        deselect = {o.name: sel["deselect"] for o, sel in zip(edit_objs, selections)}
+        target_name = None
+        if prefs.auto_coll and selections:
+            # target mesh has the most selected verts
+            counts = [len(sel["verts"]) for sel in selections]
+            if max(counts) > 0:
+                target_name = edit_objs[counts.index(max(counts))].name
+        s_verts = np.concatenate([sel["verts"] for sel in selections] or [EMPTY])
+        s_edges = np.concatenate([sel["edges"] for sel in selections] or [EMPTY_EDGES])
 
+        obj = context.object
         mesh_normal = Vector()
         mesh_center = Vector()
         align_matrix = Matrix()
         # calculate normal and center
         if len(s_verts) > 0:
-            faces = s_faces
-            if len(faces) == 0:
-                # use faces close by if no faces found
-                faces = set()
-                for v in s_verts:
-                    faces.update(v.link_faces)
-
-            # if faces found, calculate avg normal and median
-            if len(faces) > 0:
-                sum_normal = Vector()
-                sum_median = Vector()
-                for face in faces:
-                    sum_normal += face.normal
-                    sum_median += face.calc_center_median()
-                mesh_normal = sum_normal / len(faces)
-                mesh_center = sum_median / len(faces)
+            # use faces close by if no faces found
+            has_faces = any(len(sel["faces"]["area"]) for sel in selections)
+            key = "faces" if has_faces else "linked_faces"
+            normals = np.concatenate([sel[key]["normal"] for sel in selections])
+            areas = np.concatenate([sel[key]["area"] for sel in selections])
+            centers = np.concatenate([sel[key]["center"] for sel in selections])
+
+            # if faces found, calculate area weighted normal and center
+            if len(areas) > 0:
+                weights = areas if areas.sum() > 0 else np.ones_like(areas)
+                mesh_normal = Vector(weights @ normals / weights.sum())
+                mesh_center = Vector(weights @ centers / weights.sum())
 
             align_matrix = mesh_normal.to_track_quat("Z", "Y").to_matrix().to_4x4()
 
         size = 1
+        autoscale = {}
         if len(s_verts) == 0:
-            # nothing selected
+            # nothing selected, size from the active object
             max_dim = max(obj.dimensions)
             if max_dim > 0:
                 size = max_dim
         elif len(s_verts) == 1:
             # 1 vert selected
-            edge_sum = 0
-            edges = s_verts[0].link_edges
-            if len(edges) > 0:
-                for edge in edges:
-                    edge_sum += edge.calc_length()
-                size = edge_sum / len(edges)
-            mesh_center = s_verts[0].co
+            sel = next(sel for sel in selections if len(sel["verts"]))
+            lengths = sel["vert_edge_lengths"]
+            if len(lengths) > 0:
+                size = lengths.mean()
+            mesh_center = Vector(s_verts[0])
         elif len(s_edges) == 1:
             # 1 edge selected
-            size = s_edges[0].calc_length()
-            mesh_center = (s_edges[0].verts[0].co + s_edges[0].verts[1].co) / 2
+            size = np.linalg.norm(s_edges[0, 0] - s_edges[0, 1])
+            mesh_center = Vector(s_edges[0].mean(axis=0))
         else:
             # faces, edges, or verts are selected
-            local_x_axis = align_matrix.col[0].normalized()
-            local_y_axis = align_matrix.col[1].normalized()
-
-            min_x = float("inf")
-            max_x = -float("inf")
-            min_y = float("inf")
-            max_y = -float("inf")
-            geom = s_edges if len(s_edges) > 1 else s_verts
-            for g in geom:
-                # use edge midpoints to avoid diagonals
-                midpoint = (
-                    (g.verts[0].co + g.verts[1].co) / 2 if len(s_edges) > 1 else g.co
-                )
-                x_val = midpoint.dot(local_x_axis)
-                y_val = midpoint.dot(local_y_axis)
-                if x_val < min_x:
-                    min_x = x_val
-                if x_val > max_x:
-                    max_x = x_val
-                if y_val < min_y:
-                    min_y = y_val
-                if y_val > max_y:
-                    max_y = y_val
-
-            distance_x = max_x - min_x
-            distance_y = max_y - min_y
+            # use edge midpoints to avoid diagonals
+            points = s_edges.mean(axis=1) if len(s_edges) > 1 else s_verts
+            x_axis = np.array(align_matrix.col[0].to_3d())
+            y_axis = np.array(align_matrix.col[1].to_3d())
+            angle, distance_x, distance_y = fit_rectangle(points, x_axis, y_axis)
+            # turn the primitive to line up with the rectangle
+            align_matrix = align_matrix @ Matrix.Rotation(angle, 4, "Z")
 
             if distance_x > distance_y:
                 size = distance_x
-                # autoscale
-                if not self.options.is_repeat:
-                    ratio = distance_y / distance_x
-                    self.scale.y = ratio
-                    self.scale.z = ratio
+                ratio = distance_y / distance_x
+                autoscale = {"y": ratio, "z": ratio}
             else:
                 size = distance_y
-                if not self.options.is_repeat:
-                    ratio = distance_x / distance_y
-                    self.scale.x = ratio
-                    self.scale.z = ratio
+                ratio = distance_x / distance_y
+                autoscale = {"x": ratio, "z": ratio}
+
+        return {
+            "center": mesh_center,
+            "normal": mesh_normal,
+            "align": align_matrix,
+            "size": size,
+            "autoscale": autoscale,
+            "target": target_name,
+            "deselect": deselect,
+        }
+
+    def add_islands(self, context, prefs, edit_objs):
+        # one primitive per selected face island, all added in this one step
+        with profiling.phase("add_mesh.selection_scan"):
+            islands = [read_islands(o) for o in edit_objs]
+        found = [(o, sel) for o, sel in zip(edit_objs, islands) if sel is not None]
+        if not found:
+            self.report({"ERROR"}, "No faces selected")
+            return {"CANCELLED"}
+        target_obj = max(found, key=lambda item: item[1]["vert_count"])[0]
+
+        normals = np.concatenate([sel["normal"] for _, sel in found])
+        centers = np.concatenate([sel["center"] for _, sel in found])
+        points = np.concatenate([sel["points"] for _, sel in found])
+        # island numbers continue from one object to the next
+        offsets = np.cumsum([0] + [len(sel["normal"]) for _, sel in found])
+        labels = np.concatenate(
+            [sel["labels"] + offset for (_, sel), offset in zip(found, offsets)]
+        )
+
+        frames = [Vector(n).to_track_quat("Z", "Y").to_matrix() for n in normals]
+        x_axes = np.array([frame.col[0] for frame in frames])
+        y_axes = np.array([frame.col[1] for frame in frames])
+        angles, distance_x, distance_y = fit_rectangles(points, labels, x_axes, y_axes)
+        sizes = np.maximum(distance_x, distance_y)
+        # autoscale the shorter side of every island
+        ratios = np.divide(
+            np.minimum(distance_x, distance_y),
+            sizes,
+            np.ones_like(sizes),
+            where=sizes > 0,
+        )
+        wide = distance_x > distance_y
+
+        locations = []
+        rotations = []
+        scales = []
+        for i, frame in enumerate(frames):
+            align_matrix = frame.to_4x4() @ Matrix.Rotation(angles[i], 4, "Z")
+            location, rotation = self.placement(
+                Vector(centers[i]), Vector(normals[i]), align_matrix
+            )
+            locations.append(location)
+            rotations.append(rotation)
+            ratio = ratios[i]
+            autoscale = (1, ratio, ratio) if wide[i] else (ratio, 1, ratio)
+            scales.append(Vector(a * b for a, b in zip(autoscale, self.scale)))
+
+        collection = self.auto_collection(prefs, target_obj)
+        with profiling.phase("add_mesh.primitive"):
+            added_objs = primitives.add_primitives(
+                context,
+                self.idx,
+                sizes.tolist(),
+                locations,
+                rotations,
+                scales,
+                collection,
+            )
 
+        if prefs.auto_coll:
+            self.auto_collect(prefs, target_obj, added_objs)
+
+        return {"FINISHED"}
+
+    def placement(self, mesh_center, mesh_normal, align_matrix):
         loc_vector = Matrix.Translation(mesh_center) @ align_matrix @ self.location
         rot_matrix = (
             align_matrix
@@ -184,65 +300,32 @@ class POLYBLOCKER_OT_add_mesh(bpy.types.Operator):
             @ Matrix.Rotation(self.rotation.y, 4, Vector((0, mesh_normal.y, 0)))
             @ Matrix.Rotation(self.rotation.z, 4, Vector((0, 0, mesh_normal.z)))
         )
-        data = {"location": loc_vector, "rotation": rot_matrix.to_euler()}
-
-        # go into obj mode so new mesh is separated
-        bpy.ops.object.mode_set(mode="OBJECT")
-        if self.idx == 0:
-            bpy.ops.mesh.primitive_plane_add(size=size, **data)
-        elif self.idx == 1:
-            bpy.ops.mesh.primitive_cube_add(size=size, **data)
-        elif self.idx == 2:
-            bpy.ops.mesh.primitive_circle_add(radius=size / 2, **data)
-        elif self.idx == 3:
-            bpy.ops.mesh.primitive_uv_sphere_add(radius=size / 2, **data)
-        elif self.idx == 4:
-            bpy.ops.mesh.primitive_ico_sphere_add(radius=size / 2, **data)
-        elif self.idx == 5:
-            bpy.ops.mesh.primitive_cylinder_add(radius=size / 2, depth=size / 2, **data)
-        elif self.idx == 6:
-            bpy.ops.mesh.primitive_cone_add(radius1=size / 2, depth=size / 2, **data)
-        elif self.idx == 7:
-            bpy.ops.mesh.primitive_torus_add(
-                major_radius=size / 2, minor_radius=size / 4, **data
+        return loc_vector, rot_matrix.to_euler()
+
+    def auto_collection(self, prefs, target_obj):
+        # objects for a target that has its collection are added straight into
+        # it, so they are never moved or renamed
+        if not prefs.auto_coll or target_obj is None:
+            return None
+        # read first, a deleted collection starts the count over
+        collection = registry.collection(target_obj)
+        # no collection if make collection was cancelled
+        if collection is None or registry.count(target_obj) < prefs.obj_number:
+            return None
+        return collection
+
+    def auto_collect(self, prefs, target_obj, added_objs):
+        if target_obj is None:
+            return
+        before = registry.add(target_obj, added_objs)
+        if before < prefs.obj_number <= before + len(added_objs):
+            bpy.ops.polyblocker.make_collection(
+                "INVOKE_DEFAULT", target_name=target_obj.name
             )
 
-        # scale param sometimes doesn't work, so set it here
-        added_obj = context.active_object
-        added_obj.scale = self.scale
-
-        for m in meshes:
-            m["obj"].select_set(True)
-            # reverse apply transform
-            m["obj"].data.transform(m["transform"].inverted())
-            m["obj"].matrix_basis = m["transform"]
-            m["bm"].free()
-
-        bpy.ops.object.mode_set(mode="EDIT")
-
-        if prefs.auto_coll:
-            if target_obj not in added:
-                added[target_obj] = []
-            added[target_obj].append(added_obj)
-
-            if len(added[target_obj]) == prefs.obj_number:
-                bpy.ops.polyblocker.make_collection(
-                    "INVOKE_DEFAULT", target_name=target_obj.name
-                )
-            elif len(added[target_obj]) > prefs.obj_number:
-                # obj is not in dict if make collection was cancelled
-                if target_obj in collections:
-                    try:
-                        collections[target_obj].name
-                        move_to_collection(added_obj, collections[target_obj])
-                    except ReferenceError:
-                        del collections[target_obj]
-                        del added[target_obj]
-
-        return {"FINISHED"}
-
     def draw(self, context):
         layout = self.layout
+        layout.prop(self, "islands")
         row = layout.row()
 
         col = row.column()
@@ -260,22 +343,16 @@ class POLYBLOCKER_OT_add_mesh(bpy.types.Operator):
         row.operator("wm.operator_defaults", text="Reset All")
 
 
-class POLYBLOCKER_OT_make_collection(bpy.types.Operator):
-    bl_idname = "polyblocker.make_collection"
-    bl_label = "Make Collection"
-    bl_description = "Make collection"
-    bl_options = {"UNDO"}
-
-    coll_name: bpy.props.StringProperty(name="Name")
-    target_name: bpy.props.StringProperty()
+class MakeCollection:
+    """Implementation of polyblocker.make_collection"""
 
     def execute(self, context):
         target_obj = bpy.data.objects[self.target_name]
         new_coll = bpy.data.collections.new(self.coll_name)
-        collections[target_obj] = new_coll
         target_obj.users_collection[0].children.link(new_coll)
-        for obj in added[target_obj]:
-            move_to_collection(obj, new_coll)
+        objs = registry.objects(target_obj)
+        move_to_collection(objs, new_coll)
+        registry.set_collection(target_obj, new_coll)
         return {"FINISHED"}
 
     def invoke(self, context, event):
@@ -283,3 +360,242 @@ class POLYBLOCKER_OT_make_collection(bpy.types.Operator):
 
     def draw(self, context):
         self.layout.prop(self, "coll_name")
+
+
+def foreach_get(collection, attr, dtype=float, width=1):
+    data = np.empty(len(collection) * width, dtype=dtype)
+    collection.foreach_get(attr, data)
+    return data.reshape(-1, width) if width > 1 else data
+
+
+def world_faces(normals, areas, centers, matrix):
+    """World space normal, area and center of faces from their local ones"""
+    linear = matrix[:3, :3]
+    # normals use the inverse transpose
+    inverse = np.linalg.pinv(linear)
+    normals = normals @ inverse
+    lengths = np.linalg.norm(normals, axis=1)
+    normals /= np.where(lengths > 0, lengths, 1)[:, None]
+    areas = areas * abs(np.linalg.det(linear)) * lengths
+    centers = centers @ linear.T + matrix[:3, 3]
+    return normals, areas, centers
+
+
+def mesh_faces(mesh):
+    """Local normal, area and center of every face of a mesh"""
+    normals = foreach_get(mesh.polygons, "normal", width=3)
+    areas = foreach_get(mesh.polygons, "area")
+    centers = foreach_get(mesh.polygons, "center", width=3)
+    return normals, areas, centers
+
+
+def bmesh_faces(faces):
+    """Local normal, area and center of the given BMesh faces"""
+    normals = np.array([f.normal for f in faces]).reshape(-1, 3)
+    areas = np.array([f.calc_area() for f in faces])
+    centers = np.array([f.calc_center_median() for f in faces]).reshape(-1, 3)
+    return normals, areas, centers
+
+
+def world_co(co, matrix):
+    return np.asarray(co).reshape(-1, 3) @ matrix[:3, :3].T + matrix[:3, 3]
+
+
+def deselect_faces(mesh, faces):
+    bm = bmesh.from_edit_mesh(mesh)
+    bm.faces.ensure_lookup_table()
+    for i in faces:
+        bm.faces[i].select = False
+    bmesh.update_edit_mesh(mesh, loop_triangles=False, destructive=False)
+
+
+def is_small_selection(mesh, bm):
+    # the bulk reads sync and read the whole mesh, a small selection is
+    # cheaper to visit through the edit mesh
+    return mesh.total_vert_sel < len(bm.verts) * SMALL_SELECTION
+
+
+def read_selection(obj):
+    """World space selected verts, edges and faces of an edit mesh"""
+    mesh = obj.data
+    if mesh.total_vert_sel == 0:
+        return EMPTY_SELECTION
+    bm = bmesh.from_edit_mesh(mesh)
+    if is_small_selection(mesh, bm):
+        return read_selection_bmesh(obj, bm)
+
+    obj.update_from_editmode()
+    matrix = np.array(obj.matrix_world)
+    co = world_co(foreach_get(mesh.vertices, "co", width=3), matrix)
+    vert_sel = foreach_get(mesh.vertices, "select", bool)
+    edges = foreach_get(mesh.edges, "vertices", np.int32, 2)
+    edge_sel = foreach_get(mesh.edges, "select", bool)
+    face_sel = foreach_get(mesh.polygons, "select", bool)
+
+    loop_verts = foreach_get(mesh.loops, "vertex_index", np.int32)
+    loop_start = foreach_get(mesh.polygons, "loop_start", np.int32)
+    if len(loop_start) > 0:
+        # faces close by, used if no faces are selected anywhere
+        linked = np.logical_or.reduceat(vert_sel[loop_verts], loop_start)
+    else:
+        linked = face_sel
+
+    normals, areas, centers = world_faces(*mesh_faces(mesh), matrix)
+
+    # single verts are sized by the edges around them
+    vert_edges = edges[vert_sel[edges].any(axis=1)]
+    vert_edge_lengths = np.linalg.norm(
+        co[vert_edges[:, 0]] - co[vert_edges[:, 1]], axis=1
+    )
+
+    # deselect geometry
+    deselected = np.flatnonzero(face_sel).tolist()
+    deselect_faces(mesh, deselected)
+
+    def faces(mask):
+        return {"normal": normals[mask], "area": areas[mask], "center": centers[mask]}
+
+    return {
+        "verts": co[vert_sel],
+        "edges": co[edges[edge_sel]],
+        "faces": faces(face_sel),
+        "linked_faces": faces(linked),
+        "vert_edge_lengths": vert_edge_lengths,
+        "deselect": deselected,
+    }
+
+
+def read_selection_bmesh(obj, bm):
+    """read_selection that only visits the geometry around the selection"""
+    matrix = np.array(obj.matrix_world)
+    verts = [v for v in bm.verts if v.select]
+    # geometry touching the selection, in a fixed order
+    vert_edges = list(dict.fromkeys(e for v in verts for e in v.link_edges))
+    linked = list(dict.fromkeys(f for v in verts for f in v.link_faces))
+
+    co = world_co([v.co for v in verts], matrix)
+    edge_co = world_co([v.co for e in vert_edges for v in e.verts], matrix)
+    edge_co.shape = (-1, 2, 3)
+    edge_sel = np.array([e.select for e in vert_edges], dtype=bool)
+    face_sel = np.array([f.select for f in linked], dtype=bool)
+    normals, areas, centers = world_faces(*bmesh_faces(linked), matrix)
+
+    # deselect geometry, by index so the redo panel can do the same
+    bm.faces.index_update()
+    deselected = [f.index for f in linked if f.select]
+    deselect_faces(obj.data, deselected)
+
+    def faces(mask):
+        return {"normal": normals[mask], "area": areas[mask], "center": centers[mask]}
+
+    return {
+        "verts": co,
+        "edges": edge_co[edge_sel],
+        "faces": faces(face_sel),
+        "linked_faces": faces(np.ones(len(linked), dtype=bool)),
+        "vert_edge_lengths": np.linalg.norm(edge_co[:, 0] - edge_co[:, 1], axis=1),
+        "deselect": deselected,
+    }
+
+
+def island_frames(face_island, island_count, normals, areas, centers):
+    """Area weighted normal and center of every island of faces"""
+    island_areas = np.bincount(face_island, areas, island_count)
+    weights = np.where(island_areas[face_island] > 0, areas, 1)
+    totals = np.bincount(face_island, weights, island_count)
+
+    def weighted_mean(values):
+        values = values * weights[:, None]
+        return (
+            np.stack(
+                [np.bincount(face_island, v, island_count) for v in values.T], axis=1
+            )
+            / totals[:, None]
+        )
+
+    return weighted_mean(normals), weighted_mean(centers)
+
+
+def read_islands(obj):
+    """World space normal, center and edge midpoints of every selected face island"""
+    mesh = obj.data
+    if mesh.total_face_sel == 0:
+        return None
+    bm = bmesh.from_edit_mesh(mesh)
+    if is_small_selection(mesh, bm):
+        return read_islands_bmesh(obj, bm)
+
+    vert_count = mesh.total_vert_sel
+    obj.update_from_editmode()
+    matrix = np.array(obj.matrix_world)
+    face_sel = foreach_get(mesh.polygons, "select", bool)
+
+    # faces selected on either side of an edge are in the same island
+    loop_total = foreach_get(mesh.polygons, "loop_total", np.int32)
+    loop_face = np.repeat(np.arange(len(face_sel)), loop_total)
+    loop_edge = foreach_get(mesh.loops, "edge_index", np.int32)
+    selected = face_sel[loop_face]
+    loop_face = loop_face[selected]
+    loop_edge = loop_edge[selected]
+    order = np.argsort(loop_edge, kind="stable")
+    loop_face = loop_face[order]
+    loop_edge = loop_edge[order]
+    shared = loop_edge[1:] == loop_edge[:-1]
+    roots = connected_labels(
+        len(face_sel), loop_face[:-1][shared], loop_face[1:][shared]
+    )
+    island_roots, face_island = np.unique(roots[face_sel], return_inverse=True)
+    island_count = len(island_roots)
+    islands = np.full(len(face_sel), -1)
+    islands[face_sel] = face_island
+
+    normals, areas, centers = world_faces(*mesh_faces(mesh), matrix)
+    normal, center = island_frames(
+        face_island, island_count, normals[face_sel], areas[face_sel], centers[face_sel]
+    )
+
+    # use edge midpoints to avoid diagonals
+    edge_idx, first = np.unique(loop_edge, return_index=True)
+    co = world_co(foreach_get(mesh.vertices, "co", width=3), matrix)
+    edges = foreach_get(mesh.edges, "vertices", np.int32, 2)[edge_idx]
+
+    deselect_faces(mesh, np.flatnonzero(face_sel).tolist())
+
+    return {
+        "normal": normal,
+        "center": center,
+        "points": co[edges].mean(axis=1),
+        "labels": islands[loop_face[first]],
+        "vert_count": vert_count,
+    }
+
+
+def read_islands_bmesh(obj, bm):
+    """read_islands that only visits the selected faces"""
+    matrix = np.array(obj.matrix_world)
+    vert_count = obj.data.total_vert_sel
+    faces = [f for f in bm.faces if f.select]
+    groups = face_islands(faces)
+    faces = [f for group in groups for f in group]
+    face_island = np.repeat(np.arange(len(groups)), [len(group) for group in groups])
+    normal, center = island_frames(
+        face_island, len(groups), *world_faces(*bmesh_faces(faces), matrix)
+    )
+
+    # use edge midpoints to avoid diagonals, each edge once
+    edge_island = {}
+    for f, island in zip(faces, face_island.tolist()):
+        for e in f.edges:
+            edge_island.setdefault(e, island)
+    points = world_co([v.co for e in edge_island for v in e.verts], matrix)
+
+    bm.faces.index_update()
+    deselect_faces(obj.data, [f.index for f in faces])
+
+    return {
+        "normal": normal,
+        "center": center,
+        "points": points.reshape(-1, 2, 3).mean(axis=1),
+        "labels": np.fromiter(edge_island.values(), np.intp, len(edge_island)),
+        "vert_count": vert_count,
+    }
@@ -0,0 +1,495 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Wall time and peak memory of every PolyBlocker operator on generated meshes,
+# each case in a fresh Blender process so its memory peak is its own
+# usage: blender --background --factory-startup --python benchmarks/blender_suite.py
+#        -- [--sizes 1000 100000 1000000] [--operators cap_tool ...] [--output FILE]
+# or, with the bpy module: python benchmarks/blender_suite.py -- [...]
+
+import argparse
+import gc
+import json
+import math
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from types import SimpleNamespace
+
+# bpy first, the bpy module only provides bmesh once it is imported
+import bpy
+import bmesh
+import numpy as np
+from mathutils import Matrix
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON = os.path.basename(ROOT)
+OPERATORS = (
+    "add_mesh",
+    "add_mesh_islands",
+    "cap_tool",
+    "quick_mirror",
+    "bump",
+    "random_bumps",
+)
+FIXTURES = ("grid", "uv_sphere", "cylinder")
+REGION_SIZE = (1920, 1080)
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="blender_suite")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--fixtures", nargs="+", choices=FIXTURES, default=FIXTURES)
+    parser.add_argument("--operators", nargs="+", choices=OPERATORS, default=OPERATORS)
+    parser.add_argument("--output", default="benchmark_results.json")
+    # run one case and write its result to a file, what every child process does
+    parser.add_argument("--case", nargs=3, help=argparse.SUPPRESS)
+    parser.add_argument("--case-output", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def enable_addon():
+    # only on the path once bpy is imported when running as the bpy module
+    import addon_utils
+
+    sys.path.insert(0, os.path.dirname(ROOT))
+    addon_utils.enable(ADDON, default_set=True)
+    prefs = bpy.context.preferences.addons[ADDON].preferences
+    # time the work itself, not the coalescing
+    prefs.update_rate = 0
+    return sys.modules[ADDON]
+
+
+# fixtures
+
+
+def make_grid(verts):
+    n = max(2, round(math.sqrt(verts)))
+    bm = bmesh.new()
+    bmesh.ops.create_grid(bm, x_segments=n - 1, y_segments=n - 1, size=1)
+    return bm
+
+
+def make_uv_sphere(verts):
+    # 2 * s * (s - 1) + 2 verts with twice as many segments as rings
+    s = max(3, round(math.sqrt(verts / 2)))
+    bm = bmesh.new()
+    size = {"radius" if bpy.app.version >= (3, 0, 0) else "diameter": 1}
+    bmesh.ops.create_uvsphere(bm, u_segments=2 * s, v_segments=s, **size)
+    return bm
+
+
+def make_cylinder(verts):
+    # split the sides into rings so the cylinder is dense everywhere
+    segments = max(3, round(math.sqrt(verts)))
+    rings = max(0, round(verts / segments) - 2)
+    bm = bmesh.new()
+    if bpy.app.version >= (3, 0, 0):
+        size = {"radius1": 1, "radius2": 1}
+    else:
+        size = {"diameter1": 1, "diameter2": 1}
+    bmesh.ops.create_cone(bm, cap_ends=True, segments=segments, depth=2, **size)
+    if rings > 0:
+        sides = [e for e in bm.edges if abs(e.verts[0].co.z - e.verts[1].co.z) > 1]
+        bmesh.ops.subdivide_edgering(bm, edges=sides, cuts=rings)
+    return bm
+
+
+def make_fixture(kind, verts):
+    makers = {"grid": make_grid, "uv_sphere": make_uv_sphere, "cylinder": make_cylinder}
+    bm = makers[kind](verts)
+    mesh = bpy.data.meshes.new(f"{kind}_{verts}")
+    bm.to_mesh(mesh)
+    bm.free()
+    obj = bpy.data.objects.new(mesh.name, mesh)
+    bpy.context.scene.collection.objects.link(obj)
+    # objects removed by clear_scene stay in the view layer until it syncs
+    bpy.context.view_layer.update()
+    for o in bpy.context.view_layer.objects:
+        o.select_set(False)
+    obj.select_set(True)
+    bpy.context.view_layer.objects.active = obj
+    return obj
+
+
+def clear_scene():
+    if bpy.context.object is not None and bpy.context.object.mode != "OBJECT":
+        bpy.ops.object.mode_set(mode="OBJECT")
+    for obj in list(bpy.data.objects):
+        bpy.data.objects.remove(obj)
+    for mesh in list(bpy.data.meshes):
+        bpy.data.meshes.remove(mesh)
+    for collection in list(bpy.data.collections):
+        bpy.data.collections.remove(collection)
+    gc.collect()
+
+
+def patch_faces(obj, fraction=0.01):
+    # faces around the highest point, about the given share of the mesh
+    mesh = obj.data
+    co = np.empty(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", co)
+    co.shape = (-1, 3)
+    center = co.mean(axis=0)
+    center[2] = co[:, 2].max()
+
+    face_centers = np.empty(len(mesh.polygons) * 3)
+    mesh.polygons.foreach_get("center", face_centers)
+    dists = np.linalg.norm(face_centers.reshape(-1, 3) - center, axis=1)
+    count = max(1, int(len(dists) * fraction))
+    return dists <= np.partition(dists, count - 1)[count - 1]
+
+
+def face_loops(mesh):
+    loop_start = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_start", loop_start)
+    loop_total = np.empty(len(mesh.polygons), dtype=np.int32)
+    mesh.polygons.foreach_get("loop_total", loop_total)
+    loop_verts = np.empty(len(mesh.loops), dtype=np.int32)
+    mesh.loops.foreach_get("vertex_index", loop_verts)
+    return loop_start, loop_total, loop_verts
+
+
+def select_faces(obj, face_select):
+    # select the given faces along with their edges and verts
+    mesh = obj.data
+    _, loop_total, loop_verts = face_loops(mesh)
+    vert_select = np.zeros(len(mesh.vertices), dtype=bool)
+    vert_select[loop_verts[np.repeat(face_select, loop_total)]] = True
+    edge_verts = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edge_verts)
+    edge_select = vert_select[edge_verts.reshape(-1, 2)].all(axis=1)
+
+    mesh.polygons.foreach_set("select", face_select)
+    mesh.edges.foreach_set("select", edge_select)
+    mesh.vertices.foreach_set("select", vert_select)
+
+
+def select_patch(obj, fraction=0.01):
+    select_faces(obj, patch_faces(obj, fraction))
+
+
+def select_islands(obj, fraction=0.03):
+    # faces of a patch a face apart, so every one is an island of its own and
+    # their verts don't also select the faces in between
+    mesh = obj.data
+    loop_start, loop_total, loop_verts = face_loops(mesh)
+    loop_faces = np.repeat(np.arange(len(mesh.polygons)), loop_total)
+    # loops grouped by vert, for the faces around every vert
+    vert_loops = np.argsort(loop_verts, kind="stable")
+    vert_start = np.searchsorted(
+        loop_verts[vert_loops], np.arange(len(mesh.vertices) + 1)
+    )
+
+    def face_verts(i):
+        return loop_verts[loop_start[i] : loop_start[i] + loop_total[i]]
+
+    blocked = np.zeros(len(mesh.vertices), dtype=bool)
+    face_select = np.zeros(len(mesh.polygons), dtype=bool)
+    for i in np.flatnonzero(patch_faces(obj, fraction)):
+        verts = face_verts(i)
+        if blocked[verts].any():
+            continue
+        face_select[i] = True
+        # keep the next face off every face that touches this one
+        for v in verts:
+            for j in loop_faces[vert_loops[vert_start[v] : vert_start[v + 1]]]:
+                blocked[face_verts(j)] = True
+    select_faces(obj, face_select)
+
+
+# modal harness
+
+
+def fake_context(obj, view_distance=10):
+    # background mode has no window, so stand in for the ui parts of context
+    ctx = bpy.context
+    noop = lambda *args, **kwargs: None
+    width, height = REGION_SIZE
+    region_3d = SimpleNamespace(
+        view_distance=view_distance,
+        perspective_matrix=Matrix.Scale(0.1, 4),
+    )
+    return SimpleNamespace(
+        object=obj,
+        active_object=obj,
+        scene=ctx.scene,
+        view_layer=ctx.view_layer,
+        preferences=ctx.preferences,
+        selected_objects=list(ctx.selected_objects),
+        objects_in_mode=[o for o in ctx.view_layer.objects if o.mode == obj.mode],
+        region=SimpleNamespace(width=width, height=height),
+        area=SimpleNamespace(
+            header_text_set=noop,
+            spaces=SimpleNamespace(active=SimpleNamespace(region_3d=region_3d)),
+        ),
+        space_data=SimpleNamespace(region_3d=region_3d),
+        window=SimpleNamespace(cursor_modal_set=noop, cursor_modal_restore=noop),
+        workspace=SimpleNamespace(status_text_set=noop),
+        window_manager=SimpleNamespace(
+            modal_handler_add=noop,
+            event_timer_add=lambda *args, **kwargs: object(),
+            event_timer_remove=noop,
+        ),
+    )
+
+
+def event(type, x=0, y=0, value="PRESS"):
+    return SimpleNamespace(type=type, value=value, mouse_region_x=x, mouse_region_y=y)
+
+
+def register_drivers(addon):
+    # registered subclasses of the real operator shells, so runs go through
+    # bpy.types.Operator and its rules, such as read-only attributes
+    for shell in (
+        addon.operators.POLYBLOCKER_OT_cap_tool,
+        addon.operators.POLYBLOCKER_OT_quick_mirror,
+        addon.operators.POLYBLOCKER_OT_bump,
+    ):
+        # load first so the implementation's own execute doesn't replace ours
+        addon.operators.load(shell)
+        name = shell.bl_idname.split(".")[1]
+        driver = type(
+            f"POLYBLOCKER_SUITE_OT_{name}",
+            (shell,),
+            {"bl_idname": f"polyblocker_suite.{name}", "execute": run_driver},
+        )
+        bpy.utils.register_class(driver)
+
+
+driver_script = []
+
+
+def run_driver(self, context):
+    script = driver_script.pop()
+    script(self)
+    return {"FINISHED"}
+
+
+def drive(name, script, **props):
+    # background mode can't invoke modal operators, so execute runs the script
+    driver_script.append(script)
+    getattr(bpy.ops.polyblocker_suite, name)(**props)
+
+
+def run_modal(op, context, start, events):
+    if "CANCELLED" in op.invoke(context, start):
+        raise RuntimeError(f"{op.bl_idname} cancelled on invoke")
+    for e in events:
+        result = op.modal(context, e)
+        if "CANCELLED" in result:
+            # modal reports errors and reverts, the suite should fail instead
+            raise RuntimeError(f"{op.bl_idname} cancelled on {e.type}")
+        if "FINISHED" in result:
+            return
+
+
+# operator runs
+
+
+def run_add_mesh(addon, obj):
+    bpy.ops.object.mode_set(mode="EDIT")
+    bpy.ops.polyblocker.add_mesh(idx=1)
+    bpy.ops.object.mode_set(mode="OBJECT")
+
+
+def run_add_mesh_islands(addon, obj):
+    # one primitive per island with Auto Collection on, twice: the first run
+    # goes over the threshold and makes the collection, the second adds
+    # straight into it
+    prefs = bpy.context.preferences.addons[ADDON].preferences
+    face_select = np.empty(len(obj.data.polygons), dtype=bool)
+    obj.data.polygons.foreach_get("select", face_select)
+    prefs.auto_coll = True
+    try:
+        for _ in range(2):
+            # the islands are deselected once added
+            select_faces(obj, face_select)
+            bpy.ops.object.mode_set(mode="EDIT")
+            bpy.ops.polyblocker.add_mesh(idx=1, islands=True)
+            bpy.ops.object.mode_set(mode="OBJECT")
+    finally:
+        prefs.auto_coll = False
+
+
+def run_cap_tool(addon, obj):
+    def script(op):
+        context = fake_context(obj)
+        events = [event("MOUSEMOVE", x, x) for x in range(200)]
+        events += [event("WHEELUPMOUSE", 200, 200)] * 10
+        events += [event("WHEELDOWNMOUSE", 200, 200)] * 5
+        events += [event("NUMPAD_2"), event("NUMPAD_0"), event("NUMPAD_ENTER")]
+        events += [event("TIMER", 200, 200), event("LEFTMOUSE", 200, 200)]
+        run_modal(op, context, event("NONE"), events)
+
+    bpy.ops.object.mode_set(mode="EDIT")
+    drive("cap_tool", script, loop_count=5, scale_fac=0.15)
+    bpy.ops.object.mode_set(mode="OBJECT")
+
+
+def run_quick_mirror(addon, obj):
+    def script(op):
+        context = fake_context(obj)
+        center = (REGION_SIZE[0] / 2, REGION_SIZE[1] / 2)
+        # circle around the axis guides, then hold and drag to confirm
+        events = []
+        for i in range(120):
+            angle = i / 120 * math.tau
+            x = center[0] + math.cos(angle) * 200
+            y = center[1] + math.sin(angle) * 200
+            events.append(event("MOUSEMOVE", x, y))
+        events.insert(60, event("LEFTMOUSE", *center, value="PRESS"))
+        events.append(event("LEFTMOUSE", *center, value="RELEASE"))
+        run_modal(op, context, event("NONE", *center), events)
+
+    drive("quick_mirror", script)
+
+
+def run_bump(addon, obj):
+    def script(op):
+        context = fake_context(obj)
+        events = [event("MOUSEMOVE", 500, 500 + y) for y in range(200)]
+        events.append(event("LEFTMOUSE", 500, 700))
+        run_modal(op, context, event("NONE", 500, 500), events)
+
+    bpy.ops.object.mode_set(mode="EDIT")
+    drive("bump", script, distance=0)
+    bpy.ops.object.mode_set(mode="OBJECT")
+
+
+def run_random_bumps(addon, obj):
+    bpy.ops.polyblocker.random_bumps(amount=50, seed=1)
+
+
+RUNS = {
+    "add_mesh": run_add_mesh,
+    "add_mesh_islands": run_add_mesh_islands,
+    "cap_tool": run_cap_tool,
+    "quick_mirror": run_quick_mirror,
+    "bump": run_bump,
+    "random_bumps": run_random_bumps,
+}
+# how the fixture is selected before a run, a patch unless listed
+SELECTIONS = {"add_mesh_islands": select_islands}
+
+
+def peak_rss():
+    """Peak resident memory of this process in bytes"""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        # PROCESS_MEMORY_COUNTERS
+        class Counters(ctypes.Structure):
+            _fields_ = [
+                ("cb", wintypes.DWORD),
+                ("PageFaultCount", wintypes.DWORD),
+                ("PeakWorkingSetSize", ctypes.c_size_t),
+                ("WorkingSetSize", ctypes.c_size_t),
+                ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+                ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                ("PagefileUsage", ctypes.c_size_t),
+                ("PeakPagefileUsage", ctypes.c_size_t),
+            ]
+
+        counters = Counters(cb=ctypes.sizeof(Counters))
+        process = ctypes.windll.kernel32.GetCurrentProcess()
+        ctypes.windll.psapi.GetProcessMemoryInfo(
+            process, ctypes.byref(counters), counters.cb
+        )
+        return counters.PeakWorkingSetSize
+
+    import resource
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def run_case(name, kind, size):
+    """Result of one operator run on a new fixture, in this process"""
+    addon = enable_addon()
+    register_drivers(addon)
+    obj = make_fixture(kind, size)
+    SELECTIONS.get(name, select_patch)(obj)
+    result = {"operator": name, "fixture": kind, "verts": len(obj.data.vertices)}
+    gc.collect()
+    # the fixture alone, so what the operator added on top can be told apart
+    result["fixture_max_rss"] = peak_rss()
+    try:
+        start = time.perf_counter()
+        RUNS[name](addon, obj)
+        result["wall_time"] = time.perf_counter() - start
+    except Exception as e:
+        result["error"] = f"{type(e).__name__}: {e}"
+    result["max_rss"] = peak_rss()
+    return result
+
+
+def case_command(name, kind, size, output):
+    args = ["--", "--case", name, kind, str(size), "--case-output", output]
+    script = os.path.abspath(__file__)
+    if bpy.app.binary_path:
+        blender = [bpy.app.binary_path, "--background", "--factory-startup"]
+        return blender + ["--python", script] + args
+    # the bpy module has no Blender binary, its Python runs the script instead
+    return [sys.executable, script] + args
+
+
+def spawn_case(name, kind, size):
+    """Result of a case run in a fresh process"""
+    with tempfile.TemporaryDirectory() as folder:
+        path = os.path.join(folder, "result.json")
+        process = subprocess.run(
+            case_command(name, kind, size, path),
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+        )
+        # the result is written before Python shuts down, so a crash on exit
+        # doesn't lose it
+        if os.path.exists(path):
+            with open(path) as f:
+                return json.load(f)
+    error = process.stderr.strip().splitlines()[-1:] or [f"exit {process.returncode}"]
+    return {"operator": name, "fixture": kind, "verts": size, "error": error[0]}
+
+
+def main():
+    args = parse_args()
+    if args.case:
+        name, kind, size = args.case
+        result = run_case(name, kind, int(size))
+        with open(args.case_output, "w") as f:
+            json.dump(result, f)
+        return
+
+    addon = enable_addon()
+    results = []
+    for name in args.operators:
+        for kind in args.fixtures:
+            for size in args.sizes:
+                result = spawn_case(name, kind, size)
+                results.append(result)
+                status = result.get("error") or (
+                    f"{result['wall_time'] * 1000:.1f} ms"
+                    f" {result['max_rss'] / 1e6:>8.1f} MB peak"
+                )
+                print(f"{name:>16} {kind:>10} {result['verts']:>9}  {status}")
+
+    report = {
+        "blender": bpy.app.version_string,
+        "addon_version": ".".join(map(str, addon.bl_info["version"])),
+        "results": results,
+    }
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Wrote {args.output}")
+
+
+if __name__ == "__main__":
+    main()
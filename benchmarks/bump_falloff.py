@@ -0,0 +1,90 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Random Bumps on many objects at once, by worker count, runs under plain CPython
+# usage: python benchmarks/bump_falloff.py [--objects N] [--verts N] [--amount N]
+#        [--executor process|thread]
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+
+# bump_falloff has no add-on imports, so load it directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import bump_falloff
+
+
+def make_objects(count, verts, seed=0):
+    # random points with random normals, each object in its own place
+    rng = np.random.default_rng(seed)
+    objects = []
+    for i in range(count):
+        co = rng.random((verts, 3))
+        normals = rng.normal(size=(verts, 3))
+        matrix = np.eye(4)
+        matrix[:3, 3] = i * 2
+        objects.append((co, normals, matrix))
+    return objects
+
+
+def make_pool(executor, workers):
+    if executor == "thread":
+        return ThreadPoolExecutor(workers)
+    # spawned like the add-on starts them
+    return ProcessPoolExecutor(workers, multiprocessing.get_context("spawn"))
+
+
+def run(pool, objects, amount):
+    coords = [co.copy() for co, normals, matrix in objects]
+    futures = [
+        pool.submit(bump_falloff.displaced, co, n, m, f"1:{i}", amount, 0.02, 0.1)
+        for i, (co, (_, n, m)) in enumerate(zip(coords, objects))
+    ]
+    for co, future in zip(coords, futures):
+        changed, moved = future.result()
+        co[changed] = moved
+    return coords
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--objects", type=int, default=32)
+    parser.add_argument("--verts", type=int, default=200_000)
+    parser.add_argument("--amount", type=int, default=200)
+    parser.add_argument("--executor", choices=("process", "thread"), default="process")
+    args = parser.parse_args()
+
+    objects = make_objects(args.objects, args.verts)
+    with ThreadPoolExecutor(1) as pool:
+        reference = run(pool, objects, args.amount)
+    # peak is of this process, workers' own memory isn't in it
+    print(f"{'workers':>8} {'time':>12} {'speedup':>8} {'peak':>10}")
+    base = None
+    workers = 1
+    while workers <= (os.cpu_count() or 1):
+        with make_pool(args.executor, workers) as pool:
+            # start the workers first, the add-on keeps them between runs
+            list(pool.map(abs, range(workers)))
+            tracemalloc.start()
+            start = time.perf_counter()
+            result = run(pool, objects, args.amount)
+            elapsed = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        base = base or elapsed
+        # per object seeds, so the worker count must not change the result
+        assert all(np.array_equal(a, b) for a, b in zip(result, reference))
+        print(
+            f"{workers:>8} {elapsed * 1000:>9.1f} ms {base / elapsed:>8.2f}"
+            f" {peak / 1e6:>7.1f} MB"
+        )
+        workers *= 2
+
+
+if __name__ == "__main__":
+    main()
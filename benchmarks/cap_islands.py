@@ -0,0 +1,93 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Cap Tool invoke latency, grouping plus extrude, for growing selections
+# usage: blender --background --factory-startup --python benchmarks/cap_islands.py
+
+import os
+import sys
+import time
+
+import bmesh
+import bpy
+
+# reuse the fixtures and the operator driver of the Blender suite
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import blender_suite as suite
+
+GRID_VERTS = 250000
+SELECTED_FACES = (10, 100, 1000, 10000, 100000)
+LEGACY_MAX_FACES = 10000
+
+
+def legacy_islands(faces):
+    # grouping used by the cap tool before union-find, kept for comparison
+    connected_groups = []
+    for f in faces:
+        found_groups = []
+        for group in connected_groups:
+            if len(set(f.verts).intersection(group["verts"])) >= 2:
+                found_groups.append(group)
+        merged_group = {"faces": set([f]), "verts": set(f.verts)}
+        for group in found_groups:
+            merged_group["faces"].update(group["faces"])
+            merged_group["verts"].update(group["verts"])
+            connected_groups.remove(group)
+        connected_groups.append(merged_group)
+    return [list(group["faces"]) for group in connected_groups]
+
+
+def time_invoke(obj, profiling):
+    timings = {}
+
+    def script(op):
+        context = suite.fake_context(obj)
+        start = time.perf_counter()
+        result = op.invoke(context, suite.event("NONE"))
+        timings["invoke"] = time.perf_counter() - start
+        if "RUNNING_MODAL" in result:
+            op.finish(context, revert=True)
+
+    profiling.clear_stats()
+    suite.drive("cap_tool", script, loop_count=5)
+    for name in ("grouping", "extrude"):
+        timings[name] = profiling.stats[f"cap_tool.{name}"].total
+    return timings
+
+
+def main():
+    addon = suite.enable_addon()
+    suite.register_drivers(addon)
+    profiling = addon.profiling
+    profiling.configure(True)
+
+    print(
+        f"{'faces':>8} {'invoke':>12} {'grouping':>12} {'extrude':>12} {'legacy':>12}"
+    )
+    for count in SELECTED_FACES:
+        suite.clear_scene()
+        obj = suite.make_fixture("grid", GRID_VERTS)
+        suite.select_patch(obj, count / len(obj.data.polygons))
+        bpy.ops.object.mode_set(mode="EDIT")
+
+        selected = [f for f in bmesh.from_edit_mesh(obj.data).faces if f.select]
+        legacy_txt = "skipped"
+        if len(selected) <= LEGACY_MAX_FACES:
+            start = time.perf_counter()
+            legacy_islands(selected)
+            legacy_txt = f"{(time.perf_counter() - start) * 1000:.2f} ms"
+
+        timings = time_invoke(obj, profiling)
+        print(
+            f"{len(selected):>8}"
+            + "".join(
+                f" {timings[name] * 1000:>9.2f} ms"
+                for name in ("invoke", "grouping", "extrude")
+            )
+            + f" {legacy_txt:>12}"
+        )
+        bpy.ops.object.mode_set(mode="OBJECT")
+    profiling.configure(False)
+
+
+if __name__ == "__main__":
+    main()
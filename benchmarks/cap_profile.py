@@ -0,0 +1,56 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Throughput of the Cap Tool profile kernel, runs under plain CPython
+# usage: python benchmarks/cap_profile.py [--loops N] [--repeat N]
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+# cap_profile has no add-on imports, so load it directly
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import cap_profile
+
+SIZES = (10_000, 100_000, 1_000_000, 10_000_000)
+
+
+def make_cap(vert_count, loop_count, seed=0):
+    # evenly sized loops of random points
+    rng = np.random.default_rng(seed)
+    sizes = np.full(loop_count + 1, vert_count // (loop_count + 1))
+    sizes[-1] += vert_count - sizes.sum()
+    init_co = rng.random((vert_count, 3))
+    return init_co, cap_profile.loop_layout(sizes)
+
+
+def best_time(func, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--loops", type=int, default=50)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    tables = cap_profile.falloff_tables(args.loops, 0.15)
+    print(f"{'verts':>10} {'time':>12} {'Mverts/s':>10}")
+    for size in SIZES:
+        init_co, layout = make_cap(size, args.loops)
+        elapsed = best_time(
+            lambda: cap_profile.cap_coords(init_co, layout, tables, (0, 0, 1), 1.5),
+            args.repeat,
+        )
+        print(f"{size:>10} {elapsed * 1000:>9.2f} ms {size / elapsed / 1e6:>10.1f}")
+
+
+if __name__ == "__main__":
+    main()
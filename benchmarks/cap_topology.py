@@ -0,0 +1,70 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Check that parked and prefetched Cap Tool loops leave the same topology as
+# cutting the segments directly
+# usage: blender --background --factory-startup --python benchmarks/cap_topology.py
+
+import os
+import sys
+from collections import Counter
+
+import bmesh
+import bpy
+
+# reuse the fixtures and the operator driver of the Blender suite
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import blender_suite as suite
+from blender_suite import event
+
+# segments asked for, then the events that should end on that many segments
+CASES = {
+    "direct": (3, []),
+    "scroll down": (5, [event("WHEELDOWNMOUSE")] * 2),
+    "prefetch": (3, [event("TIMER")]),
+    "prefetch and scroll": (
+        3,
+        [event("TIMER"), event("WHEELUPMOUSE"), event("WHEELDOWNMOUSE")],
+    ),
+    "prefetch and scroll down": (5, [event("TIMER")] + [event("WHEELDOWNMOUSE")] * 2),
+}
+
+
+def face_sizes(kind, loop_count, events):
+    suite.clear_scene()
+    obj = suite.make_fixture(kind, 1000)
+    suite.select_patch(obj)
+    bpy.ops.object.mode_set(mode="EDIT")
+
+    def script(op):
+        context = suite.fake_context(obj)
+        moves = [event("MOUSEMOVE", 50, 50)]
+        suite.run_modal(
+            op, context, event("NONE"), moves + events + [event("LEFTMOUSE", 50, 50)]
+        )
+
+    suite.drive("cap_tool", script, loop_count=loop_count)
+    bm = bmesh.from_edit_mesh(obj.data)
+    sizes = Counter(len(f.verts) for f in bm.faces)
+    counts = (len(bm.verts), len(bm.edges), len(bm.faces))
+    bpy.ops.object.mode_set(mode="OBJECT")
+    return sizes, counts
+
+
+def main():
+    addon = suite.enable_addon()
+    suite.register_drivers(addon)
+    failed = False
+    for kind in suite.FIXTURES:
+        expected = face_sizes(kind, *CASES["direct"])
+        for name, case in CASES.items():
+            result = face_sizes(kind, *case)
+            status = "ok" if result == expected else "MISMATCH"
+            failed |= result != expected
+            sizes = dict(sorted(result[0].items()))
+            print(f"{kind:>10} {name:>26}  {status:<8} {sizes} {result[1]}")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Time to enable the add-on and the modules it pulls in, compared with
+# importing every operator implementation up front
+# usage: blender --background --factory-startup --python benchmarks/startup.py
+#        -- [--repeat N]
+
+import argparse
+import importlib
+import os
+import sys
+import time
+
+import addon_utils
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ADDON = os.path.basename(ROOT)
+# modules the add-on should only load once a tool is used
+HEAVY = ("gpu", "gpu_extras", "numpy", "bmesh", "bpy_extras")
+IMPLEMENTATIONS = ("add_mesh", "bump", "cap_tool", "quick_mirror")
+
+
+def parse_args():
+    argv = sys.argv[sys.argv.index("--") + 1 :] if "--" in sys.argv else []
+    parser = argparse.ArgumentParser(prog="startup")
+    parser.add_argument("--repeat", type=int, default=10)
+    return parser.parse_args(argv)
+
+
+def unload():
+    addon_utils.disable(ADDON)
+    for name in list(sys.modules):
+        if name == ADDON or name.startswith(ADDON + "."):
+            del sys.modules[name]
+
+
+def enable(eager=False):
+    start = time.perf_counter()
+    addon_utils.enable(ADDON)
+    if eager:
+        # what enabling cost before the operators were loaded on first use
+        for name in IMPLEMENTATIONS:
+            importlib.import_module(f"{ADDON}.{name}")
+    return time.perf_counter() - start
+
+
+def main():
+    args = parse_args()
+    sys.path.insert(0, os.path.dirname(ROOT))
+
+    # cold runs first, later runs find the heavy modules already imported
+    before = set(sys.modules)
+    lazy_cold = enable()
+    loaded = sorted(
+        name for name in set(sys.modules) - before if name.split(".")[0] in HEAVY
+    )
+    submodules = sorted(
+        name.split(".", 1)[1] for name in sys.modules if name.startswith(ADDON + ".")
+    )
+    unload()
+    eager_cold = enable(eager=True)
+
+    lazy_warm = []
+    eager_warm = []
+    for _ in range(args.repeat):
+        unload()
+        lazy_warm.append(enable())
+        unload()
+        eager_warm.append(enable(eager=True))
+    unload()
+
+    print(f"{'':<16}{'cold ms':>10}{'warm ms':>10}")
+    print(f"{'lazy enable':<16}{lazy_cold * 1000:>10.2f}{min(lazy_warm) * 1000:>10.2f}")
+    print(
+        f"{'eager enable':<16}{eager_cold * 1000:>10.2f}{min(eager_warm) * 1000:>10.2f}"
+    )
+    print(f"heavy modules   {', '.join(loaded) or 'none'}")
+    print(f"submodules      {', '.join(submodules)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,93 +2,246 @@
 
 import bpy
 import bmesh
-import random
+import multiprocessing
+import os
+import sys
 import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from mathutils import Vector
+from bpy_extras import view3d_utils
+from . import instancing, profiling
+from .bump_falloff import displaced, selection_weights
+from .scheduler import UpdateScheduler
 
+# worker processes of All Selected, started on first use and kept for redos
+workers = None
+# run first in every worker: importing the add-on package runs its __init__,
+# which needs bpy, so workers get the package as an empty shell that only
+# finds the bpy-free modules in its folder
+WORKER_SETUP = """
+import sys, types
+package = types.ModuleType({name!r})
+package.__path__ = [{path!r}]
+sys.modules[{name!r}] = package
+"""
 
-class POLYBLOCKER_OT_bump(bpy.types.Operator):
-    bl_idname = "polyblocker.bump"
-    bl_label = "Bump"
-    bl_description = "Proportional translate constrained to normal"
-    bl_options = {"UNDO", "REGISTER"}
 
-    @classmethod
-    def poll(cls, context):
-        return context.mode == "EDIT_MESH"
+class Bump:
+    """Implementation of polyblocker.bump"""
+
+    def invoke(self, context, event):
+        if not self.prepare(context):
+            self.report({"ERROR"}, "No vertices selected")
+            return {"CANCELLED"}
+        self.distance = 0
+        self.init_mouse_pos = Vector((event.mouse_region_x, event.mouse_region_y))
+        self.mouse_pos = self.init_mouse_pos.copy()
+        self.axis = self.drag_axis(context)
+
+        context.window.cursor_modal_set("SCROLL_Y")
+        context.workspace.status_text_set(
+            "Left Click/Enter: Confirm     Right Click/Esc: Cancel"
+        )
+        prefs = context.preferences.addons[__package__].preferences
+        self.scheduler = UpdateScheduler(context, prefs.update_rate)
+        context.window_manager.modal_handler_add(self)
+        return {"RUNNING_MODAL"}
+
+    def modal(self, context, event):
+        try:
+            if event.type == "MOUSEMOVE":
+                # only record the pointer, the scheduler decides when to update
+                self.mouse_pos = Vector((event.mouse_region_x, event.mouse_region_y))
+                self.scheduler.request()
+            elif (
+                event.type in {"LEFTMOUSE", "RET", "NUMPAD_ENTER"}
+                and event.value == "PRESS"
+            ):
+                # apply the latest pointer position before confirming
+                self.scheduler.flush(self.update, context, force=True)
+                self.finish(context)
+                return {"FINISHED"}
+            elif event.type in {"RIGHTMOUSE", "ESC"}:
+                self.finish(context, revert=True)
+                return {"CANCELLED"}
+            self.scheduler.flush(self.update, context)
+        except Exception as e:
+            self.report({"ERROR"}, f"Error: {str(e)}")
+            self.finish(context, revert=True)
+            return {"CANCELLED"}
+        return {"RUNNING_MODAL"}
 
     def execute(self, context):
-        old_pivot_point = context.scene.tool_settings.transform_pivot_point
-        context.scene.tool_settings.transform_pivot_point = "INDIVIDUAL_ORIGINS"
+        # used for redo, moves the bump straight to the stored distance
+        if not self.prepare(context):
+            self.report({"ERROR"}, "No vertices selected")
+            return {"CANCELLED"}
+        self.apply(self.distance)
+        self.update_meshes(normals=True)
+        return {"FINISHED"}
 
-        bm = bmesh.from_edit_mesh(context.object.data)
-        s_verts = [v for v in bm.verts if v.select]
+    def prepare(self, context):
+        # every mesh in edit mode is bumped, like transform.translate does
+        reads = [read_bump_mesh(o) for o in context.objects_in_mode if o.type == "MESH"]
+        reads = [r for r in reads if len(r["selected"]) > 0]
+        if not reads:
+            return False
 
+        # sizes and distances in world space like proportional editing
+        lengths = np.concatenate([r["edge_lengths"] for r in reads])
         size = 1
-        if len(s_verts) > 0:
-            # use avg edge length for size
-            edges = s_verts[0].link_edges
-            if len(edges) > 0:
-                edge_sum = sum(e.calc_length() for e in edges)
-                # multiply by 3 for more rounded bump
-                size = (edge_sum / len(edges)) * 3
-
-        bpy.ops.transform.translate(
-            "INVOKE_DEFAULT",
-            constraint_axis=(False, False, True),
-            orient_type="NORMAL",
-            use_proportional_edit=True,
-            proportional_size=size,
+        if len(lengths) > 0:
+            # multiply by 3 for more rounded bump
+            size = np.median(lengths) * 3 or 1
+
+        normal = sum(r["normal"] for r in reads)
+        length = np.linalg.norm(normal)
+        normal = normal / length if length > 0 else np.array((0, 0, 1.0))
+        self.normal = Vector(normal)
+        self.center = Vector(
+            np.concatenate([r["world_co"][r["selected"]] for r in reads]).mean(axis=0)
         )
-        context.scene.tool_settings.transform_pivot_point = old_pivot_point
-        return {"FINISHED"}
 
+        self.targets = []
+        for r in reads:
+            with profiling.phase("bump.neighbourhood"):
+                affected, weights = selection_weights(
+                    r["world_co"], r["selected"], size
+                )
+            visible = ~r["hide"][affected]
+            affected = affected[visible]
+            weights = weights[visible]
 
-class POLYBLOCKER_OT_random_bumps(bpy.types.Operator):
-    bl_idname = "polyblocker.random_bumps"
-    bl_label = "Random Bumps"
-    bl_description = "Random bumps"
-    bl_options = {"UNDO", "REGISTER"}
+            mesh = r["obj"].data
+            bm = bmesh.from_edit_mesh(mesh)
+            bm.verts.ensure_lookup_table()
+            self.targets.append(
+                {
+                    "mesh": mesh,
+                    "bm": bm,
+                    "verts": [bm.verts[i] for i in affected.tolist()],
+                    "init_co": r["co"][affected],
+                    # local offset of every affected vertex for a move of 1
+                    # along the normal
+                    "offsets": weights[:, None] * (r["inverse"] @ normal),
+                }
+            )
+        return True
 
-    amount: bpy.props.IntProperty(name="Amount", min=0, default=5)
-    depth: bpy.props.FloatProperty(name="Depth", default=0.1)
-    falloff_size: bpy.props.FloatProperty(name="Falloff Size", default=1, min=0.01)
-    seed: bpy.props.IntProperty(name="Seed", min=0)
-    mode: bpy.props.EnumProperty(
-        name="Mode", items=[("BUMP", "Bump", ""), ("INDENT", "Indent", "")]
-    )
+    def drag_axis(self, context):
+        # screen direction of the normal, so the bump follows the mouse
+        region = context.region
+        r3d = context.space_data.region_3d
+        start = view3d_utils.location_3d_to_region_2d(region, r3d, self.center)
+        end = view3d_utils.location_3d_to_region_2d(
+            region, r3d, self.center + self.normal
+        )
+        if start is None or end is None or (end - start).length < 1:
+            # normal points at the viewer
+            return None
+        return end - start
+
+    @profiling.timed("bump.update")
+    def update(self, context):
+        delta = self.mouse_pos - self.init_mouse_pos
+        if self.axis is None:
+            # get approximate distance relative to viewport
+            ratio = delta.y / ((context.region.width + context.region.height) / 2)
+            self.distance = ratio * context.space_data.region_3d.view_distance
+        else:
+            self.distance = delta.dot(self.axis) / self.axis.length_squared
+        self.apply(self.distance)
+        self.update_meshes()
+        context.area.header_text_set(f"Bump: {self.distance:.4f}")
+
+    def apply(self, distance):
+        for target in self.targets:
+            co = target["init_co"] + target["offsets"] * distance
+            for v, c in zip(target["verts"], co.tolist()):
+                v.co = c
+
+    def update_meshes(self, normals=False):
+        # a full update with normals only once the bump is done
+        for target in self.targets:
+            if normals:
+                target["bm"].normal_update()
+                bmesh.update_edit_mesh(target["mesh"])
+            else:
+                bmesh.update_edit_mesh(
+                    target["mesh"], loop_triangles=False, destructive=False
+                )
+
+    def finish(self, context, revert=False):
+        if revert:
+            self.apply(0)
+        self.update_meshes(normals=True)
+        context.area.header_text_set(None)
+        context.workspace.status_text_set(None)
+        context.window.cursor_modal_restore()
+        self.scheduler.remove(context)
+
+
+class RandomBumps:
+    """Implementation of polyblocker.random_bumps"""
 
     def execute(self, context):
         obj = context.object
-        old_mode = obj.mode
-        bpy.ops.object.mode_set(mode="EDIT")
-        bm = bmesh.from_edit_mesh(obj.data)
+        if self.all_selected:
+            if context.mode != "OBJECT":
+                self.report({"ERROR"}, "All Selected only works in Object Mode")
+                return {"CANCELLED"}
+            objs = [o for o in context.selected_objects if o.type == "MESH"]
+        else:
+            objs = [obj] if obj is not None and obj.type == "MESH" else []
+        if not objs:
+            self.report({"ERROR"}, "No mesh selected")
+            return {"CANCELLED"}
 
-        for vert in bm.verts:
-            vert.select = False
-        for face in bm.faces:
-            face.select = False
         if not self.options.is_repeat:
-            size = sum(obj.dimensions) / 60
+            dims = objs[0].dimensions if len(objs) == 1 else bounds_dimensions(objs)
+            size = sum(dims) / 60
             self.depth = size
             self.falloff_size = size * 6
             self.seed = int(time.time() * 1000) % 1000
-        
-        random.seed(self.seed)
-        depth = self.depth if self.mode == "BUMP" else -self.depth
-        bm.verts.ensure_lookup_table()
-        for v in (random.randint(0, len(bm.verts) - 1) for _ in range(self.amount)):
-            bm.verts[v].select = True
-            bpy.ops.transform.translate(
-                value=(0, 0, depth),
-                constraint_axis=(False, False, True),
-                orient_type="NORMAL",
-                use_proportional_edit=True,
-                proportional_size=self.falloff_size,
-            )
-            bm.verts[v].select = False
 
-        bmesh.update_edit_mesh(obj.data)
-        bpy.ops.object.mode_set(mode=old_mode)
+        # writing to a shared primitive would bump every instance of it
+        instancing.make_single_users(objs)
+        if self.all_selected:
+            # objects on one mesh would overwrite each other, bump it once
+            objs = list({o.data: o for o in objs}.values())
+            # a seed per object, so the result doesn't depend on the worker count
+            jobs = [(o, f"{self.seed}:{o.name}") for o in objs]
+        else:
+            if obj.mode == "EDIT":
+                obj.update_from_editmode()
+            jobs = [(obj, self.seed)]
+
+        depth = self.depth if self.mode == "BUMP" else -self.depth
+        thread_count = max(1, min(len(jobs), os.cpu_count() or 1))
+        # one object isn't worth a round trip to another process
+        processes = worker_pool() if len(jobs) > 1 else None
+        with profiling.phase("random_bumps.displace"):
+            with ThreadPoolExecutor(thread_count) as threads:
+                # workers only get plain arrays, bpy stays on this thread
+                arrays = [mesh_arrays(o.data) for o, seed in jobs]
+                args = [
+                    (co, normals, np.array(o.matrix_world), seed, self.amount, depth)
+                    for (o, seed), (co, normals) in zip(jobs, arrays)
+                ]
+                falloff = self.falloff_size
+                try:
+                    results = displace_all(processes or threads, args, falloff)
+                except BrokenProcessPool:
+                    # a worker died, start new ones next time and finish on threads
+                    shutdown_workers()
+                    results = displace_all(threads, args, falloff)
+                for (o, seed), (co, normals), (changed, moved) in zip(
+                    jobs, arrays, results
+                ):
+                    co[changed] = moved
+                    write_coords(o, co, changed)
         return {"FINISHED"}
 
     def draw(self, context):
@@ -99,5 +252,110 @@ class POLYBLOCKER_OT_random_bumps(bpy.types.Operator):
         layout.prop(self, "depth")
         layout.prop(self, "falloff_size")
         layout.prop(self, "seed")
+        layout.prop(self, "all_selected")
         row = layout.row()
         row.prop(self, "mode", expand=True)
+
+
+def worker_pool():
+    """Process pool for the bump kernel, None where workers can't be started"""
+    global workers
+    # spawned workers run the __main__ script again first, and a script that
+    # Blender was started with needs bpy, which they don't have
+    if getattr(sys.modules["__main__"], "__file__", None):
+        return None
+    if workers is None:
+        # fork isn't safe with the threads Blender runs
+        context = multiprocessing.get_context("spawn")
+        if bpy.app.version < (2, 91, 0):
+            # sys.executable was Blender itself before 2.91
+            context.set_executable(bpy.app.binary_path_python)
+        setup = WORKER_SETUP.format(name=__package__, path=os.path.dirname(__file__))
+        workers = ProcessPoolExecutor(
+            os.cpu_count() or 1, context, initializer=exec, initargs=(setup,)
+        )
+    return workers
+
+
+def shutdown_workers():
+    global workers
+    if workers is not None:
+        workers.shutdown(wait=False)
+        workers = None
+
+
+def displace_all(pool, args, size):
+    """Moved indices and coordinates of every job, displaced on pool"""
+    futures = [pool.submit(displaced, *job, size) for job in args]
+    return [future.result() for future in futures]
+
+
+def mesh_arrays(mesh):
+    """Vertex coordinates and normals as (N, 3) arrays"""
+    co = np.empty(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("co", co)
+    normals = np.empty(len(mesh.vertices) * 3)
+    mesh.vertices.foreach_get("normal", normals)
+    return co.reshape(-1, 3), normals.reshape(-1, 3)
+
+
+def read_bump_mesh(obj):
+    """Selection of an edit mesh with what Bump needs, in world space"""
+    obj.update_from_editmode()
+    mesh = obj.data
+    co, normals = mesh_arrays(mesh)
+    select = np.empty(len(co), dtype=bool)
+    mesh.vertices.foreach_get("select", select)
+    selected = np.flatnonzero(select)
+    hide = np.empty(len(co), dtype=bool)
+    mesh.vertices.foreach_get("hide", hide)
+
+    matrix = np.array(obj.matrix_world)
+    inverse = np.array(obj.matrix_world.to_3x3().inverted_safe())
+    world_co = co @ matrix[:3, :3].T + matrix[:3, 3]
+    edges = np.empty(len(mesh.edges) * 2, dtype=np.int32)
+    mesh.edges.foreach_get("vertices", edges)
+    edges.shape = (-1, 2)
+    ends = select[edges]
+    s_edges = edges[ends.all(axis=1)]
+    if len(s_edges) == 0:
+        # single vertices use the edges around them
+        s_edges = edges[ends.any(axis=1)]
+    lengths = world_co[s_edges[:, 0]] - world_co[s_edges[:, 1]]
+
+    return {
+        "obj": obj,
+        "co": co,
+        "world_co": world_co,
+        "selected": selected,
+        "hide": hide,
+        "inverse": inverse,
+        "normal": (normals[selected] @ inverse).sum(axis=0),
+        "edge_lengths": np.linalg.norm(lengths, axis=1),
+    }
+
+
+def bounds_dimensions(objs):
+    """Size of the world space box around the bound boxes of objs"""
+    corners = np.concatenate(
+        [
+            np.array(o.bound_box) @ np.array(o.matrix_world.to_3x3()).T
+            + np.array(o.matrix_world.translation)
+            for o in objs
+        ]
+    )
+    return corners.max(axis=0) - corners.min(axis=0)
+
+
+def write_coords(obj, co, changed):
+    """Write back the changed vertices in whichever mode the object is in"""
+    if obj.mode == "EDIT":
+        bm = bmesh.from_edit_mesh(obj.data)
+        bm.verts.ensure_lookup_table()
+        for i, v in zip(changed.tolist(), co[changed].tolist()):
+            bm.verts[i].co = v
+        bm.normal_update()
+        bmesh.update_edit_mesh(obj.data)
+    else:
+        obj.data.vertices.foreach_set("co", co.ravel())
+        obj.data.update()
@@ -0,0 +1,120 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Random Bumps math on plain arrays, kept free of bpy so objects can be
+# displaced in worker processes and benchmarked outside of Blender
+
+import random
+
+import numpy as np
+
+# offsets of a cell and the 26 cells around it
+NEIGHBOURS = np.stack(
+    np.meshgrid([-1, 0, 1], [-1, 0, 1], [-1, 0, 1], indexing="ij"), axis=-1
+).reshape(-1, 3)
+# sources and candidate pairs handled together, bounds the neighbour and pair
+# arrays to a few tens of MB on top of the per-vertex cell keys
+SOURCE_BLOCK = 1 << 13
+PAIR_BLOCK = 1 << 18
+
+
+def random_centers(seed, vert_count, amount):
+    # same sequence as seeding the global generator, so old seeds keep their bumps
+    rng = random.Random(seed)
+    return [rng.randint(0, vert_count - 1) for _ in range(amount)]
+
+
+def smooth_falloff(dist, size):
+    # the smooth falloff of proportional editing
+    t = 1 - dist / size
+    return t * t * (3 - 2 * t)
+
+
+def pairs_within(co, sources, size, targets=None):
+    """Vertex, source position and distance of every pair closer than size"""
+    # hash vertices into cells as wide as the falloff, so a source only has to
+    # look at the cells around it
+    cells = np.floor(co / size).astype(np.int64)
+    cells -= cells.min(axis=0) - 1
+    dims = cells.max(axis=0) + 2
+    keys = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+    if targets is None:
+        order = np.argsort(keys, kind="stable")
+    else:
+        # only targets go in the cells, so sources with no target around them
+        # pair with nothing
+        targets = np.asarray(targets, dtype=np.intp)
+        order = targets[np.argsort(keys[targets], kind="stable")]
+    sorted_keys = keys[order]
+
+    sources = np.asarray(sources, dtype=np.intp)
+    for first_source in range(0, len(sources), SOURCE_BLOCK):
+        block = sources[first_source : first_source + SOURCE_BLOCK]
+        near = (cells[block, None, :] + NEIGHBOURS).reshape(-1, 3)
+        near_keys = (near[:, 0] * dims[1] + near[:, 1]) * dims[2] + near[:, 2]
+        start = np.searchsorted(sorted_keys, near_keys, "left")
+        counts = np.searchsorted(sorted_keys, near_keys, "right") - start
+        ends = np.cumsum(counts)
+        total = int(ends[-1]) if len(ends) > 0 else 0
+
+        # every vertex in a neighbouring cell paired with its source, a block
+        # of pairs at a time
+        for first in range(0, total, PAIR_BLOCK):
+            pair = np.arange(first, min(first + PAIR_BLOCK, total))
+            cell = np.searchsorted(ends, pair, "right")
+            vert = order[start[cell] + pair - (ends[cell] - counts[cell])]
+            source = cell // len(NEIGHBOURS)
+            dist = np.linalg.norm(co[vert] - co[block[source]], axis=1)
+            inside = dist < size
+            yield vert[inside], source[inside] + first_source, dist[inside]
+
+
+def bump_offsets(co, centers, directions, size):
+    """Sum of the falloff weighted offsets of every bump"""
+    offsets = np.zeros_like(co)
+    if len(centers) == 0:
+        return offsets
+    for vert, bump, dist in pairs_within(co, centers, size):
+        weight = smooth_falloff(dist, size)
+        for axis in range(3):
+            offsets[:, axis] += np.bincount(
+                vert, weight * directions[bump, axis], minlength=len(co)
+            )
+    return offsets
+
+
+def selection_weights(co, selected, size):
+    """Vertices within size of the selection and their falloff weights"""
+    # like proportional editing, the distance is to the closest selected vertex
+    nearest = np.full(len(co), np.inf)
+    nearest[selected] = 0
+    # selected vertices are already at 0, so only the rest need pairing
+    others = np.flatnonzero(np.isinf(nearest))
+    for vert, source, dist in pairs_within(co, selected, size, others):
+        np.minimum.at(nearest, vert, dist)
+    affected = np.flatnonzero(nearest < size)
+    return affected, smooth_falloff(nearest[affected], size)
+
+
+def displace(co, normals, matrix, seed, amount, depth, size):
+    """Bump local coordinates in place, returns the indices that moved"""
+    if len(co) == 0:
+        return np.empty(0, dtype=np.intp)
+    centers = random_centers(seed, len(co), amount)
+
+    # bump in world space like proportional editing does
+    matrix = np.asarray(matrix, dtype=co.dtype)
+    inverse = np.linalg.pinv(matrix[:3, :3])
+    world_co = co @ matrix[:3, :3].T + matrix[:3, 3]
+    directions = normals[centers] @ inverse
+    lengths = np.linalg.norm(directions, axis=1, keepdims=True)
+    directions *= depth / np.where(lengths > 0, lengths, 1)
+
+    offsets = bump_offsets(world_co, centers, directions, size)
+    co += offsets @ inverse.T
+    return np.flatnonzero(offsets.any(axis=1))
+
+
+def displaced(co, normals, matrix, seed, amount, depth, size):
+    """displace for another process, returns the moved indices and coordinates"""
+    changed = displace(co, normals, matrix, seed, amount, depth, size)
+    return changed, co[changed]
@@ -0,0 +1,45 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Cap Tool profile math on plain arrays, kept free of bpy so it can be
+# benchmarked and profiled outside of Blender
+
+import numpy as np
+
+
+def loop_layout(loop_sizes):
+    """Loop index of every vertex, plus the start and size of every loop"""
+    loop_size = np.asarray(loop_sizes, dtype=np.intp)
+    loop_start = np.zeros(len(loop_size), dtype=np.intp)
+    np.cumsum(loop_size[:-1], out=loop_start[1:])
+    loop_idx = np.repeat(np.arange(len(loop_size)), loop_size)
+    return loop_idx, loop_start, loop_size
+
+
+def falloff_tables(loop_count, scale_fac, flip_scale=False):
+    """Translate and scale factor of every loop, from the base up"""
+    # exponential profile, lowest loop moves least and scales most
+    exponent = np.arange(1, loop_count + 2) / (loop_count + 2)
+    translate = (scale_fac**exponent - 1) / (scale_fac - 1)
+    scale = translate[::-1].copy()
+    if flip_scale:
+        scale = 1 / scale
+    return translate, scale
+
+
+def cap_coords(init_co, layout, tables, normal, distance, invert=False):
+    """Move loops along the normal, then scale each one around its center"""
+    loop_idx, loop_start, loop_size = layout
+    translate, scale = tables
+    if invert:
+        distance = -distance
+    displacement = np.asarray(normal, dtype=init_co.dtype) * distance
+
+    co = translate[loop_idx, None] * displacement
+    co += init_co
+    centers = np.add.reduceat(co, loop_start, axis=0)
+    centers /= loop_size[:, None]
+    centers = centers[loop_idx]
+    co -= centers
+    co *= scale[loop_idx, None]
+    co += centers
+    return co
@@ -1,67 +1,45 @@
 # Copyright (C) 2023 Daniel Boxer
 
-import bpy
 import bmesh
+import numpy as np
 from mathutils import Vector
-from . import line_draw
+from . import cap_profile, line_draw, profiling
+from .mesh_utils import face_islands
+from .scheduler import UpdateScheduler
 
+# parked loops built ahead of time for scrolling up
+PREFETCH_SEGMENTS = 8
 
-class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
-    bl_idname = "polyblocker.cap_tool"
-    bl_label = "Cap Tool"
-    bl_description = "Cap"
-    bl_options = {"UNDO", "GRAB_CURSOR", "BLOCKING"}
 
-    loop_count: bpy.props.IntProperty(name="Segments", default=5)
-    scale_fac: bpy.props.FloatProperty(name="Scale", default=0.15)
-    invert: bpy.props.BoolProperty(name="Invert")
-    control_len: bpy.props.BoolProperty(name="Control Length")
-    flip_scale: bpy.props.BoolProperty(name="Flip Scale")
-
-    @classmethod
-    def poll(cls, context):
-        obj = context.object
-        return obj is not None and obj.mode == "EDIT" and obj.type == "MESH"
+class CapTool:
+    """Implementation of polyblocker.cap_tool"""
 
     def invoke(self, context, event):
         self.init_mouse_pos = Vector((event.mouse_region_x, event.mouse_region_y))
+        self.mouse_pos = self.init_mouse_pos.copy()
         self.bm = bmesh.from_edit_mesh(context.object.data)
 
-        active_face = None
-        connected_groups = []
+        active_face = self.bm.faces.active
         # get selected faces and find connected
-        for f in self.bm.faces:
-            if f.select:
-                if f == self.bm.faces.active:
-                    active_face = f
-                found_groups = []
-                for group in connected_groups:
-                    # faces are connected if they share 2 or more verts
-                    if len(set(f.verts).intersection(group["verts"])) >= 2:
-                        found_groups.append(group)
-
-                # merge all found groups
-                merged_group = {"faces": set([f]), "verts": set(f.verts)}
-                for group in found_groups:
-                    merged_group["faces"].update(group["faces"])
-                    merged_group["verts"].update(group["verts"])
-                    connected_groups.remove(group)
-                connected_groups.append(merged_group)
-
-        if len(connected_groups) == 0:
+        with profiling.phase("cap_tool.grouping"):
+            selected = [f for f in self.bm.faces if f.select]
+            connected_groups = face_islands(selected)
+        if len(selected) == 0:
             self.report({"ERROR"}, "No faces selected")
             return {"CANCELLED"}
+        if active_face is not None and not active_face.select:
+            active_face = None
 
         start_verts = set()
         normal_sum = Vector()
         self.origin_faces = []
-        largest_group = max(connected_groups, key=lambda group: len(group["faces"]))
+        largest_group = max(connected_groups, key=len)
         # deselect other groups
         for group in connected_groups:
-            if group != largest_group:
-                for f in group["faces"]:
+            if group is not largest_group:
+                for f in group:
                     f.select = False
-        largest_group = set(largest_group["faces"])
+        largest_group = set(largest_group)
         for f in largest_group:
             start_verts.update(list(f.verts))
             self.origin_faces.append(f)
@@ -76,12 +54,11 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
 
         # extrude and store new geometry
         new_verts = []
-        new_verts_co = []
-        for g in bmesh.ops.extrude_face_region(self.bm, geom=self.origin_faces)["geom"]:
+        with profiling.phase("cap_tool.extrude"):
+            extruded = bmesh.ops.extrude_face_region(self.bm, geom=self.origin_faces)
+        for g in extruded["geom"]:
             if isinstance(g, bmesh.types.BMVert):
                 new_verts.append(g)
-                # need to make vector copy
-                new_verts_co.append(g.co.copy())
             elif isinstance(g, bmesh.types.BMEdge):
                 g.hide = False
             elif isinstance(g, bmesh.types.BMFace):
@@ -89,31 +66,34 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
                 g.select = True
         self.bm.faces.active = active_face
 
-        self.loops = []
-        self.init_loop_co = []
-        old_verts = set(self.bm.verts)
-        segment_edge = self.get_segment_edge(new_verts[0], start_verts)
-        for _ in range(self.loop_count):
-            try:
-                self.segment(segment_edge, old_verts)
-            except AttributeError:
-                self.report({"ERROR"}, "Too many faces selected")
-                bmesh.ops.delete(self.bm, geom=new_verts)
-                self.finish(context, revert=True)
-                return {"CANCELLED"}
-
-        # fix order
-        if len(self.loops) > 0:
-            if self.get_segment_edge(self.loops[0][0], start_verts) is None:
-                self.loops.reverse()
-                self.init_loop_co.reverse()
-        # add initial faces as last loop
-        self.loops.append(new_verts)
-        self.init_loop_co.append(new_verts_co)
+        self.loops = [new_verts]
+        self.init_loop_co = [vert_coords(new_verts)]
+        self.pool = []
+        self.scheduler = None
+        segment_count = self.loop_count
+        self.loop_count = 0
+        segment_edge = None
+        for v in new_verts:
+            segment_edge = self.get_segment_edge(v, start_verts)
+            if segment_edge is not None:
+                break
+        if segment_edge is None:
+            # closed selection, so there is no side to segment
+            self.report({"ERROR"}, "Too many faces selected")
+            bmesh.ops.delete(self.bm, geom=new_verts)
+            self.loops = []
+            self.finish(context, revert=True)
+            return {"CANCELLED"}
+        self.find_rails(segment_edge, start_verts)
+        self.add_segments(segment_count)
+
+        self.packed = False
+        self.topology_changed = True
         if len(self.loops) == 1:
             self.select_first()
 
         self.segment_input = ""
+        self.tables_key = None
         context.window.cursor_modal_set("SCROLL_XY")
         context.workspace.status_text_set(
             "Left Click: Confirm     Right Click/Esc: Cancel"
@@ -121,34 +101,41 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
             "     A/D: Change Scale     F: Flip Scale     C: Control Length"
             "     I: Invert     R: Reset"
         )
+        prefs = context.preferences.addons[__package__].preferences
+        self.scheduler = UpdateScheduler(context, prefs.update_rate)
         context.window_manager.modal_handler_add(self)
         return {"RUNNING_MODAL"}
 
     def modal(self, context, event):
         try:
             if event.type == "MOUSEMOVE":
-                self.update(context, event)
+                # only record the pointer, the scheduler decides when to update
+                self.mouse_pos = Vector((event.mouse_region_x, event.mouse_region_y))
+                self.scheduler.request()
+            elif event.type == "TIMER":
+                if self.scheduler.is_idle() and self.prefetch():
+                    self.scheduler.request()
             elif event.type == "WHEELUPMOUSE" and self.loop_count < 250:
                 self.add_segment()
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "WHEELDOWNMOUSE" and self.loop_count > 0:
                 self.del_segment()
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "A" and event.value == "PRESS" and self.scale_fac > 0.02:
                 self.scale_fac -= 0.01
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "D" and event.value == "PRESS":
                 self.scale_fac += 0.01
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "I" and event.value == "PRESS":
                 self.invert = not self.invert
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "C" and event.value == "PRESS":
                 self.control_len = not self.control_len
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "F" and event.value == "PRESS":
                 self.flip_scale = not self.flip_scale
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "R" and event.value == "PRESS":
                 self.set_segments(5)
                 self.scale_fac = 0.15
@@ -156,7 +143,7 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
                 self.control_len = False
                 self.flip_scale = False
                 self.segment_input = ""
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type.startswith("NUMPAD_") and event.value == "PRESS":
                 val = event.type[7:]
                 if val.isdigit() and 0 <= int(self.segment_input + val) <= 250:
@@ -165,60 +152,60 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
                 elif val == "ENTER":
                     self.set_segments(int(self.segment_input))
                     self.segment_input = ""
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "BACK_SPACE" and event.value == "PRESS":
                 self.segment_input = self.segment_input[:-1]
-                self.update(context, event)
+                self.scheduler.request()
             elif event.type == "LEFTMOUSE":
+                # apply the latest pointer position before confirming
+                self.scheduler.flush(self.update, context, force=True)
                 self.finish(context)
                 return {"FINISHED"}
             elif event.type in {"RIGHTMOUSE", "ESC"}:
                 self.finish(context, revert=True)
                 return {"FINISHED"}
+            self.scheduler.flush(self.update, context)
         except Exception as e:
             self.report({"ERROR"}, f"Error: {str(e)}")
             self.finish(context, revert=True)
             return {"CANCELLED"}
         return {"RUNNING_MODAL"}
 
-    def update(self, context, event):
-        current_pos = Vector((event.mouse_region_x, event.mouse_region_y))
-        distance_px = (current_pos - self.init_mouse_pos).length
+    @profiling.timed("cap_tool.update")
+    def update(self, context):
+        distance_px = (self.mouse_pos - self.init_mouse_pos).length
         ratio = distance_px / ((context.region.width + context.region.height) / 2)
         # get approximate distance relative to viewport
         distance_m = ratio * context.area.spaces.active.region_3d.view_distance
-        if self.invert:
-            distance_m *= -1
-        # get translate vector
-        displacement = self.avg_normal * distance_m
-
-        def falloff(segment_idx, max_val):
-            return (
-                max_val
-                * (self.scale_fac ** ((segment_idx + 1) / (self.loop_count + 2)) - 1)
-                / (self.scale_fac - 1)
-            )
-
-        for loop_idx, loop in enumerate(self.loops):
-            v_sum = Vector()
-            falloff_disp = falloff(loop_idx, displacement)
-            # move loop
-            for v_idx, v in enumerate(loop):
-                new_co = self.init_loop_co[loop_idx][v_idx] + falloff_disp
-                v.co = new_co
-                v_sum += new_co
-
-            center = v_sum / len(loop)
-            # scale loop
-            falloff_scale = falloff(self.loop_count - loop_idx, 1)
-            if self.flip_scale:
-                falloff_scale = 1 / falloff_scale
-            for v_idx, v in enumerate(loop):
-                v.co = center + (v.co - center) * falloff_scale
-
-        # calling this with no args fixes dark faces bug?
-        bmesh.ops.triangulate(self.bm)
-        bmesh.update_edit_mesh(context.object.data)
+        if not self.packed:
+            self.pack_loops()
+        key = (self.loop_count, self.scale_fac, self.flip_scale)
+        if self.tables_key != key:
+            self.tables = cap_profile.falloff_tables(*key)
+            self.tables_key = key
+        new_co = cap_profile.cap_coords(
+            self.flat_init_co,
+            self.loop_layout,
+            self.tables,
+            self.avg_normal,
+            distance_m,
+            self.invert,
+        )
+        for v, co in zip(self.flat_verts, new_co.tolist()):
+            v.co = co
+
+        # stale normals on the moved faces are what made them render dark
+        for f in self.touched_faces:
+            f.normal_update()
+        for v in self.touched_verts:
+            v.normal_update()
+        # tessellation only needs rebuilding after segments change
+        bmesh.update_edit_mesh(
+            context.object.data,
+            loop_triangles=self.topology_changed,
+            destructive=self.topology_changed,
+        )
+        self.topology_changed = False
 
         count_txt = f"[{self.segment_input}]" if self.segment_input else self.loop_count
         invert_txt = "ON" if self.invert else "OFF"
@@ -230,71 +217,131 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
             f"     Control Length: {control_len_txt}     Invert: {invert_txt}"
         )
         line_draw.draw_guide(
-            (tuple(self.init_mouse_pos), tuple(current_pos)), (0, 0, 0, 1)
+            (tuple(self.init_mouse_pos), tuple(self.mouse_pos)), (0, 0, 0, 1)
         )
 
-    def segment(self, segment_edge, old_verts):
-        def walk(edge):
-            yield edge
-            edge.tag = True
+    def pack_loops(self):
+        # flatten loops so update can move every vertex in one step
+        self.flat_verts = [v for loop in self.loops for v in loop]
+        self.flat_init_co = np.concatenate(self.init_loop_co)
+        self.loop_layout = cap_profile.loop_layout([len(loop) for loop in self.loops])
+        self.touched_faces = {f for v in self.flat_verts for f in v.link_faces}
+        self.touched_verts = {v for f in self.touched_faces for v in f.verts}
+        self.packed = True
+
+    def find_rails(self, segment_edge, start_verts):
+        # walk the ring of quads around the cap, only visiting its own edges
+        ring = [segment_edge]
+        visited = {segment_edge}
+        stack = [segment_edge]
+        while stack:
+            edge = stack.pop()
             for l in edge.link_loops:
                 loop = l.link_loop_radial_next.link_loop_next.link_loop_next
-                if not (len(loop.face.verts) != 4 or loop.edge.tag):
-                    yield from walk(loop.edge)
+                if len(loop.face.verts) == 4 and loop.edge not in visited:
+                    visited.add(loop.edge)
+                    ring.append(loop.edge)
+                    stack.append(loop.edge)
+
+        # rails run from the base of the cap to the extruded faces
+        self.rail_base = []
+        self.rail_top = []
+        for e in ring:
+            base, top = e.verts
+            if base not in start_verts:
+                base, top = top, base
+            self.rail_base.append(base)
+            self.rail_top.append(top)
 
-        # reset loops so initial pos is correct for new loop
+    @profiling.timed("cap_tool.segment")
+    def add_segments(self, n):
+        if n <= 0:
+            return
+        lowest = self.loops[0] if self.loop_count > 0 else self.rail_top
+        # reset loops so initial pos is correct for new loops
         if not self.control_len:
-            for loop_idx, loop in enumerate(self.loops):
-                for v_idx, v in enumerate(loop):
-                    v.co = self.init_loop_co[loop_idx][v_idx]
-        for e in self.bm.edges:
-            e.tag = False
-        # do cuts one at a time to keep order
-        cut_faces = bmesh.ops.subdivide_edgering(
-            self.bm, edges=list(walk(segment_edge)), cuts=1
-        )
+            for loop, init_co in zip(self.loops, self.init_loop_co):
+                for v, co in zip(loop, init_co.tolist()):
+                    v.co = co
+        lowest_co = [v.co.copy() for v in lowest]
 
-        # find new loop
-        new = []
-        for f in cut_faces["faces"]:
-            f.select = True
-            for v in f.verts:
-                if v not in old_verts:
-                    new.append(v)
-                    # keep track of new vertices
-                    old_verts.add(v)
+        # reuse parked loops first since they only need moving
+        reused = min(n, len(self.pool))
+        new_loops = self.pool[len(self.pool) - reused :]
+        del self.pool[len(self.pool) - reused :]
+        if n > reused:
+            below = new_loops[-1] if new_loops else self.rail_base
+            new_loops.extend(self.cut(below, lowest, n - reused))
+
+        # place loops where repeated halving towards the base would
+        for i, loop in enumerate(new_loops):
+            fac = 0.5 ** (n - i)
+            for v, base, co in zip(loop, self.rail_base, lowest_co):
+                v.co = base.co.lerp(co, fac)
 
-        self.loops.append(new)
-        self.init_loop_co.append([v.co.copy() for v in new])
+        self.loops[0:0] = new_loops
+        self.init_loop_co[0:0] = [vert_coords(loop) for loop in new_loops]
+        self.loop_count += n
+        self.packed = False
 
     def add_segment(self):
-        start_verts = set(v for f in self.origin_faces for v in f.verts)
-        segment_edge = self.get_segment_edge(self.loops[0][0], start_verts)
-        self.segment(segment_edge, set(self.bm.verts))
-        # move new loop to the bottom
-        self.loops.insert(0, self.loops.pop())
-        self.init_loop_co.insert(0, self.init_loop_co.pop())
-        self.loop_count += 1
+        self.add_segments(1)
 
+    @profiling.timed("cap_tool.segment")
     def del_segment(self):
-        lv = set(self.loops[0])
-        old = [e for e in self.bm.edges if e.verts[0] in lv and e.verts[1] in lv]
-        bmesh.ops.dissolve_edges(self.bm, edges=old)
-        bmesh.ops.dissolve_verts(self.bm, verts=self.loops[0])
-        del self.loops[0]
+        # park the loop on the base instead of dissolving it
+        loop = self.loops.pop(0)
         del self.init_loop_co[0]
+        self.collapse(loop)
+        self.pool.append(loop)
+        self.packed = False
         self.select_first()
         self.loop_count -= 1
 
+    def cut(self, below, above, n):
+        ring = [self.bm.edges.get((a, b)) for a, b in zip(below, above)]
+        # make every cut at once instead of one subdivision per segment
+        cut_faces = bmesh.ops.subdivide_edgering(self.bm, edges=ring, cuts=n)["faces"]
+        new_verts = set()
+        for f in cut_faces:
+            f.select = True
+            new_verts.update(f.verts)
+        new_verts.difference_update(below, above)
+
+        # loops are ordered from the base up, verts by rail
+        new_loops = [[] for _ in range(n)]
+        for v in below:
+            for i, chain_v in enumerate(rail_chain(v, new_verts, n)):
+                new_loops[i].append(chain_v)
+        self.topology_changed = True
+        return new_loops
+
+    def collapse(self, loop):
+        for v, base in zip(loop, self.rail_base):
+            v.co = base.co
+
+    @profiling.timed("cap_tool.segment")
+    def prefetch(self):
+        # build parked loops while idle so scrolling up doesn't subdivide
+        if self.pool:
+            return False
+        lowest = self.loops[0] if self.loop_count > 0 else self.rail_top
+        self.pool = self.cut(self.rail_base, lowest, PREFETCH_SEGMENTS)
+        for loop in self.pool:
+            self.collapse(loop)
+        self.packed = False
+        return True
+
     def get_segment_edge(self, vert, start_verts):
         for e in vert.link_edges:
             if e.other_vert(vert) in start_verts:
                 return e
 
     def set_segments(self, n):
-        op = self.add_segment if n - self.loop_count > 0 else self.del_segment
-        for _ in range(abs(n - self.loop_count)):
-            op()
+        if n > self.loop_count:
+            self.add_segments(n - self.loop_count)
+        for _ in range(self.loop_count - n):
+            self.del_segment()
 
     def select_first(self):
         for v in self.loops[0]:
@@ -302,10 +349,15 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
                 if len(set(f.verts).intersection(set(self.loops[0]))) > 0:
                     f.select = True
 
+    @profiling.timed("cap_tool.finish")
     def finish(self, context, revert=False):
+        if self.scheduler is not None:
+            self.scheduler.remove(context)
+        parked = [v for loop in self.pool for v in loop]
         if revert:
             # delete new geometry
-            bmesh.ops.delete(self.bm, geom=[v for loop in self.loops for v in loop])
+            new_verts = [v for loop in self.loops for v in loop]
+            bmesh.ops.delete(self.bm, geom=new_verts + parked)
             bmesh.ops.recalc_face_normals(self.bm, faces=self.origin_faces)
             for f in self.origin_faces:
                 f.hide = False
@@ -313,6 +365,17 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
                 for e in f.edges:
                     e.hide = False
         else:
+            # only now remove parked loops from the topology, one ring at a
+            # time so the rail edges between parked loops stay
+            for loop in self.pool:
+                # loops are ordered by rail, not around the ring, so take every
+                # edge inside the loop
+                loop_set = set(loop)
+                ring = {
+                    e for v in loop for e in v.link_edges if e.other_vert(v) in loop_set
+                }
+                bmesh.ops.dissolve_edges(self.bm, edges=list(ring))
+                bmesh.ops.dissolve_verts(self.bm, verts=loop)
             # delete original faces
             bmesh.ops.delete(self.bm, geom=self.origin_faces, context="FACES")
         bmesh.update_edit_mesh(context.object.data)
@@ -320,3 +383,26 @@ class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
         context.workspace.status_text_set(None)
         context.window.cursor_modal_restore()
         line_draw.remove("guide")
+
+
+def vert_coords(verts):
+    co = np.empty((len(verts), 3))
+    for i, v in enumerate(verts):
+        co[i] = v.co
+    return co
+
+
+def rail_chain(base, new_verts, n):
+    # first new vert above the base, then follow the rail upwards
+    edge = next(e for e in base.link_edges if e.other_vert(base) in new_verts)
+    v = edge.other_vert(base)
+    chain = [v]
+    for _ in range(n - 1):
+        # the next rail edge shares no face with the previous one
+        faces = set(edge.link_faces)
+        edge = next(
+            e for e in v.link_edges if e is not edge and faces.isdisjoint(e.link_faces)
+        )
+        v = edge.other_vert(v)
+        chain.append(v)
+    return chain
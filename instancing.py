@@ -0,0 +1,102 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Shared unit meshes for primitives, objects carry their size in their scale
+# and get their own copy of the mesh once they are edited
+
+import bpy
+from bpy.app.handlers import persistent
+from mathutils import Matrix
+
+# (idx, segments) to mesh name, one unit mesh per primitive type
+mesh_cache = {}
+owner = object()
+# segment settings of every primitive, part of the key so a file saved with
+# other settings never hands out a stale mesh
+SEGMENTS = ((1, 1), (), (32,), (32, 16), (2,), (32,), (32,), (48, 12))
+
+
+def cache_key(idx):
+    return f"{idx}:{SEGMENTS[idx]}"
+
+
+def shared_mesh(idx):
+    """Unit size mesh of a primitive, built once and shared"""
+    key = cache_key(idx)
+    name = mesh_cache.get(key)
+    mesh = bpy.data.meshes.get(name) if name is not None else None
+    # names can point at another mesh after an undo or rename
+    if mesh is None or mesh.get("polyblocker_shared") != key:
+        from . import primitives
+
+        mesh = primitives.build_mesh(idx, 1)
+        mesh["polyblocker_shared"] = key
+    mesh_cache[key] = mesh.name
+    return mesh
+
+
+def make_single_user(obj):
+    # bake the primitive size back into the mesh, like an unshared primitive
+    size = obj.get("polyblocker_size", 1) or 1
+    mesh = obj.data.copy()
+    del mesh["polyblocker_shared"]
+    mesh.transform(Matrix.Scale(size, 4))
+    obj.data = mesh
+    obj.scale = obj.scale / size
+    if "polyblocker_size" in obj:
+        del obj["polyblocker_size"]
+
+
+def is_shared(obj):
+    return obj.type == "MESH" and "polyblocker_shared" in obj.data
+
+
+def make_single_users(objs):
+    # object mode writes skip the edit mode split, so split before writing
+    for obj in objs:
+        if obj.mode == "OBJECT" and is_shared(obj):
+            make_single_user(obj)
+
+
+def split_edited():
+    # edits would change every instance, so edited objects get their own mesh
+    objs = [
+        o for o in bpy.context.selected_objects if o.mode == "EDIT" and is_shared(o)
+    ]
+    if objs:
+        bpy.ops.object.mode_set(mode="OBJECT")
+        for obj in objs:
+            make_single_user(obj)
+        bpy.ops.object.mode_set(mode="EDIT")
+    return None
+
+
+def mode_changed():
+    objs = bpy.context.selected_objects
+    if any(o.mode == "EDIT" and is_shared(o) for o in objs):
+        # mode can't be changed from inside the notification
+        if not bpy.app.timers.is_registered(split_edited):
+            bpy.app.timers.register(split_edited)
+
+
+def subscribe():
+    bpy.msgbus.subscribe_rna(
+        key=(bpy.types.Object, "mode"), owner=owner, args=(), notify=mode_changed
+    )
+
+
+@persistent
+def load_post(*args):
+    # meshes of the old file are gone and subscriptions are cleared on load
+    mesh_cache.clear()
+    subscribe()
+
+
+def register():
+    subscribe()
+    bpy.app.handlers.load_post.append(load_post)
+
+
+def unregister():
+    bpy.app.handlers.load_post.remove(load_post)
+    bpy.msgbus.clear_by_owner(owner)
+    mesh_cache.clear()
@@ -1,53 +1,86 @@
 # Copyright (C) 2023 Daniel Boxer
 
 import bpy
-import gpu
-from gpu_extras.batch import batch_for_shader
 
-SHADER_2D_NAME = "UNIFORM_COLOR" if bpy.app.version >= (4, 0, 0) else "2D_UNIFORM_COLOR"
-SHADER_3D_NAME = "UNIFORM_COLOR" if bpy.app.version >= (4, 0, 0) else "3D_UNIFORM_COLOR"
-SHADER_2D = gpu.shader.from_builtin(SHADER_2D_NAME)
-SHADER_3D = gpu.shader.from_builtin(SHADER_3D_NAME)
 COLOURS = {"X": (1, 0, 0, 1), "Y": (0, 1, 0, 1), "Z": (0, 0, 1, 1)}
+# one draw handler per draw type, shared by every overlay of that type
 handles = {}
-batches = {}
+overlays = {}
+# created on first draw, so background mode never touches the gpu module
+shaders = {}
 
 
-def make_batch(shader, coords):
-    return batch_for_shader(shader, "LINES", {"pos": coords})
+class Overlay:
+    def __init__(self, draw_type, coords, colour):
+        self.draw_type = draw_type
+        self.coords = coords
+        self.colour = colour
+        # built on first draw after the coords change
+        self.batch = None
 
 
-def add_handle(name, callback, type):
-    handles[name] = bpy.types.SpaceView3D.draw_handler_add(callback, (), "WINDOW", type)
+def get_shader(draw_type):
+    shader = shaders.get(draw_type)
+    if shader is None:
+        import gpu
 
+        if bpy.app.version >= (4, 0, 0):
+            name = "UNIFORM_COLOR"
+        elif draw_type == "POST_PIXEL":
+            name = "2D_UNIFORM_COLOR"
+        else:
+            name = "3D_UNIFORM_COLOR"
+        shader = shaders[draw_type] = gpu.shader.from_builtin(name)
+    return shader
 
-def change_colour(shader, colour):
-    shader.uniform_float("color", colour)
 
+def make_batch(shader, coords):
+    from gpu_extras.batch import batch_for_shader
 
-def draw_guide(coords, colour):
-    def draw():
-        change_colour(SHADER_2D, colour)
-        make_batch(SHADER_2D, coords).draw(SHADER_2D)
+    return batch_for_shader(shader, "LINES", {"pos": coords})
 
-    remove("guide")
-    add_handle("guide", draw, "POST_PIXEL")
 
+def draw(draw_type):
+    shader = get_shader(draw_type)
+    shader.bind()
+    for overlay in overlays.values():
+        if overlay.draw_type == draw_type and overlay.coords:
+            if overlay.batch is None:
+                overlay.batch = make_batch(shader, overlay.coords)
+            shader.uniform_float("color", overlay.colour)
+            overlay.batch.draw(shader)
+
+
+def set_overlay(name, draw_type, colour, coords=()):
+    # coords are copied so later changes to the caller's vectors are caught
+    coords = tuple(tuple(co) for co in coords)
+    overlay = overlays.get(name)
+    if overlay is None:
+        overlays[name] = Overlay(draw_type, coords, colour)
+    else:
+        overlay.colour = colour
+        if coords and coords != overlay.coords:
+            overlay.coords = coords
+            overlay.batch = None
+    if draw_type not in handles:
+        handles[draw_type] = bpy.types.SpaceView3D.draw_handler_add(
+            draw, (draw_type,), "WINDOW", draw_type
+        )
 
-def draw_axis(name, colour, coords=()):
-    def draw():
-        change_colour(SHADER_3D, colour)
-        # just change colour if no coords
-        if coords:
-            batches[name] = make_batch(SHADER_3D, coords)
-        batches[name].draw(SHADER_3D)
 
-    if not coords:
-        remove(name)
-    add_handle(name, draw, "POST_VIEW")
+def draw_guide(coords, colour):
+    set_overlay("guide", "POST_PIXEL", colour, coords)
+
+
+def draw_axis(name, colour, coords=()):
+    # just change colour if no coords
+    set_overlay(name, "POST_VIEW", colour, coords)
 
 
 def remove(name):
-    if name in handles:
-        bpy.types.SpaceView3D.draw_handler_remove(handles[name], "WINDOW")
-        del handles[name]
+    overlay = overlays.pop(name, None)
+    if overlay is None:
+        return
+    draw_type = overlay.draw_type
+    if not any(o.draw_type == draw_type for o in overlays.values()):
+        bpy.types.SpaceView3D.draw_handler_remove(handles.pop(draw_type), "WINDOW")
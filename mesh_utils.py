@@ -0,0 +1,95 @@
+# Copyright (C) 2023 Daniel Boxer
+
+import numpy as np
+
+# eigenvalues closer than this share of the larger one count as equal
+ISOTROPY = 1e-3
+
+
+def find_root(parent, i):
+    # path halving keeps the trees flat
+    while parent[i] != i:
+        parent[i] = parent[parent[i]]
+        i = parent[i]
+    return i
+
+
+def face_islands(faces):
+    """Split faces into islands of faces connected by shared edges"""
+    index = {f: i for i, f in enumerate(faces)}
+    parent = list(range(len(faces)))
+    for i, f in enumerate(faces):
+        for e in f.edges:
+            for linked in e.link_faces:
+                j = index.get(linked)
+                if j is None or j == i:
+                    continue
+                root_i = find_root(parent, i)
+                root_j = find_root(parent, j)
+                if root_i != root_j:
+                    parent[root_j] = root_i
+
+    islands = {}
+    for i, f in enumerate(faces):
+        islands.setdefault(find_root(parent, i), []).append(f)
+    return list(islands.values())
+
+
+def connected_labels(count, a, b):
+    """Smallest node index in the component of every node, for links a[i]-b[i]"""
+    parent = np.arange(count)
+    while True:
+        # hook the larger root onto the smaller one, roots only ever decrease
+        # so no cycles can form
+        root_a = parent[a]
+        root_b = parent[b]
+        np.minimum.at(parent, np.maximum(root_a, root_b), np.minimum(root_a, root_b))
+        # pointer jumping, every node ends up pointing at its root
+        while True:
+            grand = parent[parent]
+            if np.array_equal(grand, parent):
+                break
+            parent = grand
+        if np.array_equal(parent[a], parent[b]):
+            return parent
+
+
+def fit_rectangles(points, labels, x_axes, y_axes):
+    """Turn around the normal and size of the rectangle fitting each point group"""
+    count = len(x_axes)
+    u = np.einsum("ij,ij->i", points, x_axes[labels])
+    v = np.einsum("ij,ij->i", points, y_axes[labels])
+    totals = np.bincount(labels, minlength=count)
+    u -= (np.bincount(labels, u, count) / totals)[labels]
+    v -= (np.bincount(labels, v, count) / totals)[labels]
+    suu = np.bincount(labels, u * u, count)
+    svv = np.bincount(labels, v * v, count)
+    suv = np.bincount(labels, u * v, count)
+
+    # difference of the covariance eigenvalues and the larger one
+    spread = np.hypot(suu - svv, 2 * suv)
+    major = (suu + svv + spread) / 2
+    # without a main direction, keep the given axes
+    angles = np.where(
+        spread > ISOTROPY * major, 0.5 * np.arctan2(2 * suv, suu - svv), 0
+    )
+    c = np.cos(angles)[labels]
+    s = np.sin(angles)[labels]
+
+    def extents(values):
+        high = np.full(count, -np.inf)
+        low = np.full(count, np.inf)
+        np.maximum.at(high, labels, values)
+        np.minimum.at(low, labels, values)
+        return high - low
+
+    return angles, extents(u * c + v * s), extents(v * c - u * s)
+
+
+def fit_rectangle(points, x_axis, y_axis):
+    """Turn around the normal and size of the rectangle that fits the points"""
+    labels = np.zeros(len(points), dtype=np.intp)
+    angles, size_x, size_y = fit_rectangles(
+        points, labels, np.array([x_axis]), np.array([y_axis])
+    )
+    return float(angles[0]), size_x[0], size_y[0]
@@ -0,0 +1,237 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Operator shells registered at startup. They only hold the ids, properties and
+# polls, the implementation modules are imported the first time a tool is used
+
+import bpy
+import importlib
+
+
+def load(cls):
+    """Import the implementation of a shell and copy its methods onto it"""
+    if not cls.loaded:
+        module_name, mixin_name = cls.implementation
+        module = importlib.import_module(f".{module_name}", __package__)
+        mixin = getattr(module, mixin_name)
+        for name, value in vars(mixin).items():
+            if not name.startswith("__"):
+                setattr(cls, name, value)
+        cls.loaded = True
+    return cls
+
+
+def lazy(name):
+    """Callback that loads the implementation, then hands over to it"""
+    # registration checks the argument count, so no *args here
+    if name in {"invoke", "modal"}:
+
+        def callback(self, context, event):
+            return getattr(load(type(self)), name)(self, context, event)
+
+    else:
+
+        def callback(self, context):
+            return getattr(load(type(self)), name)(self, context)
+
+    callback.__name__ = name
+    return callback
+
+
+def edit_mesh_poll(context):
+    obj = context.object
+    return obj is not None and obj.mode == "EDIT" and obj.type == "MESH"
+
+
+class POLYBLOCKER_OT_add_mesh(bpy.types.Operator):
+    bl_idname = "polyblocker.add_mesh"
+    bl_label = "Add Mesh"
+    bl_description = "Add mesh"
+    bl_options = {"UNDO", "REGISTER"}
+
+    implementation = ("add_mesh", "AddMesh")
+    loaded = False
+
+    idx: bpy.props.IntProperty(options={"SKIP_SAVE"})
+    location: bpy.props.FloatVectorProperty(
+        subtype="TRANSLATION", description="Translate on local axes"
+    )
+    rotation: bpy.props.FloatVectorProperty(
+        subtype="EULER", description="Rotate on local axes"
+    )
+    scale: bpy.props.FloatVectorProperty(
+        default=(1, 1, 1), subtype="XYZ", description="Scale on local axes"
+    )
+    islands: bpy.props.BoolProperty(
+        name="Per Island",
+        description="Add a primitive for every island of selected faces",
+        options={"SKIP_SAVE"},
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return edit_mesh_poll(context)
+
+    execute = lazy("execute")
+    draw = lazy("draw")
+
+
+class POLYBLOCKER_OT_add_primitive(bpy.types.Operator):
+    bl_idname = "polyblocker.add_primitive"
+    bl_label = "Add Primitive"
+    bl_description = "Add primitive"
+    bl_options = {"UNDO", "REGISTER"}
+
+    implementation = ("primitives", "AddPrimitive")
+    loaded = False
+
+    idx: bpy.props.IntProperty(options={"SKIP_SAVE"})
+    size: bpy.props.FloatProperty(name="Size", default=2, min=0, subtype="DISTANCE")
+    depth: bpy.props.FloatProperty(
+        name="Depth",
+        description="Depth of cylinders and cones, 0 for half the size",
+        min=0,
+        subtype="DISTANCE",
+    )
+    location: bpy.props.FloatVectorProperty(name="Location", subtype="TRANSLATION")
+    rotation: bpy.props.FloatVectorProperty(name="Rotation", subtype="EULER")
+    scale: bpy.props.FloatVectorProperty(name="Scale", default=(1, 1, 1), subtype="XYZ")
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "OBJECT"
+
+    execute = lazy("execute")
+
+
+class POLYBLOCKER_OT_fit_primitives(bpy.types.Operator):
+    bl_idname = "polyblocker.fit_primitives"
+    bl_label = "Fit Primitives"
+    bl_description = "Add a primitive fitted to the bounds of every selected object"
+    bl_options = {"UNDO", "REGISTER"}
+
+    implementation = ("primitives", "FitPrimitives")
+    loaded = False
+
+    shape: bpy.props.EnumProperty(
+        name="Shape",
+        items=[
+            ("PLANE", "Plane", "", "MESH_PLANE", 0),
+            ("CUBE", "Cube", "", "MESH_CUBE", 1),
+            ("CIRCLE", "Circle", "", "MESH_CIRCLE", 2),
+            ("SPHERE", "UV Sphere", "", "MESH_UVSPHERE", 3),
+            ("ICOSPHERE", "Ico Sphere", "", "MESH_ICOSPHERE", 4),
+            ("CYLINDER", "Cylinder", "", "MESH_CYLINDER", 5),
+            ("CONE", "Cone", "", "MESH_CONE", 6),
+            ("TORUS", "Torus", "", "MESH_TORUS", 7),
+        ],
+        default="CUBE",
+    )
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "OBJECT"
+
+    execute = lazy("execute")
+
+
+class POLYBLOCKER_OT_make_collection(bpy.types.Operator):
+    bl_idname = "polyblocker.make_collection"
+    bl_label = "Make Collection"
+    bl_description = "Make collection"
+    bl_options = {"UNDO"}
+
+    implementation = ("add_mesh", "MakeCollection")
+    loaded = False
+
+    coll_name: bpy.props.StringProperty(name="Name")
+    target_name: bpy.props.StringProperty()
+
+    execute = lazy("execute")
+    invoke = lazy("invoke")
+    draw = lazy("draw")
+
+
+class POLYBLOCKER_OT_cap_tool(bpy.types.Operator):
+    bl_idname = "polyblocker.cap_tool"
+    bl_label = "Cap Tool"
+    bl_description = "Cap"
+    bl_options = {"UNDO", "GRAB_CURSOR", "BLOCKING"}
+
+    implementation = ("cap_tool", "CapTool")
+    loaded = False
+
+    loop_count: bpy.props.IntProperty(name="Segments", default=5)
+    scale_fac: bpy.props.FloatProperty(name="Scale", default=0.15)
+    invert: bpy.props.BoolProperty(name="Invert")
+    control_len: bpy.props.BoolProperty(name="Control Length")
+    flip_scale: bpy.props.BoolProperty(name="Flip Scale")
+
+    @classmethod
+    def poll(cls, context):
+        return edit_mesh_poll(context)
+
+    invoke = lazy("invoke")
+    modal = lazy("modal")
+
+
+class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
+    bl_idname = "polyblocker.quick_mirror"
+    bl_label = "Quick Mirror"
+    bl_description = "Quick mirror"
+    bl_options = {"UNDO", "BLOCKING"}
+
+    implementation = ("quick_mirror", "QuickMirror")
+    loaded = False
+
+    @classmethod
+    def poll(cls, context):
+        obj = context.object
+        return obj is not None and obj.type == "MESH"
+
+    invoke = lazy("invoke")
+    modal = lazy("modal")
+
+
+class POLYBLOCKER_OT_bump(bpy.types.Operator):
+    bl_idname = "polyblocker.bump"
+    bl_label = "Bump"
+    bl_description = "Proportional translate constrained to normal"
+    bl_options = {"UNDO", "REGISTER", "GRAB_CURSOR", "BLOCKING"}
+
+    implementation = ("bump", "Bump")
+    loaded = False
+
+    distance: bpy.props.FloatProperty(name="Distance", subtype="DISTANCE")
+
+    @classmethod
+    def poll(cls, context):
+        return context.mode == "EDIT_MESH"
+
+    execute = lazy("execute")
+    invoke = lazy("invoke")
+    modal = lazy("modal")
+
+
+class POLYBLOCKER_OT_random_bumps(bpy.types.Operator):
+    bl_idname = "polyblocker.random_bumps"
+    bl_label = "Random Bumps"
+    bl_description = "Random bumps"
+    bl_options = {"UNDO", "REGISTER"}
+
+    implementation = ("bump", "RandomBumps")
+    loaded = False
+
+    amount: bpy.props.IntProperty(name="Amount", min=0, default=5)
+    depth: bpy.props.FloatProperty(name="Depth", default=0.1)
+    falloff_size: bpy.props.FloatProperty(name="Falloff Size", default=1, min=0.01)
+    seed: bpy.props.IntProperty(name="Seed", min=0)
+    mode: bpy.props.EnumProperty(
+        name="Mode", items=[("BUMP", "Bump", ""), ("INDENT", "Indent", "")]
+    )
+    all_selected: bpy.props.BoolProperty(
+        name="All Selected",
+        description="Bump every selected mesh object, in Object Mode only",
+    )
+
+    execute = lazy("execute")
+    draw = lazy("draw")
@@ -0,0 +1,271 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Add Mesh primitives built straight into mesh data, same sizes and defaults as
+# the bpy.ops.mesh.primitive_*_add operators without their overhead
+
+import bpy
+import bmesh
+import math
+import numpy as np
+from mathutils import Matrix, Vector
+from . import instancing
+
+# names given by the matching add operators, in pie menu order
+NAMES = ("Plane", "Cube", "Circle", "Sphere", "Icosphere", "Cylinder", "Cone", "Torus")
+# primitives with a depth of their own
+DEPTH_TYPES = {5, 6}
+# object types that have a bound box
+BOUNDED_TYPES = {"MESH", "CURVE", "SURFACE", "META", "FONT"}
+
+
+def radius_args(*names, value):
+    # bmesh ops took a diameter argument that was really a radius before 3.0
+    if bpy.app.version < (3, 0, 0):
+        names = [name.replace("radius", "diameter") for name in names]
+    return {name: value for name in names}
+
+
+def create_torus(bm, major_radius, minor_radius, uv_layer):
+    major_segments = 48
+    minor_segments = 12
+    verts = []
+    for i in range(major_segments):
+        u = i / major_segments * math.tau
+        for j in range(minor_segments):
+            v = j / minor_segments * math.tau
+            ring = major_radius + minor_radius * math.cos(v)
+            co = (ring * math.cos(u), ring * math.sin(u), minor_radius * math.sin(v))
+            verts.append(bm.verts.new(co))
+    for i in range(major_segments):
+        for j in range(minor_segments):
+            corners = ((i, j), (i + 1, j), (i + 1, j + 1), (i, j + 1))
+            face = bm.faces.new(
+                verts[(a % major_segments) * minor_segments + b % minor_segments]
+                for a, b in corners
+            )
+            for loop, (a, b) in zip(face.loops, corners):
+                loop[uv_layer].uv = (a / major_segments, b / minor_segments)
+
+
+def build_mesh(idx, size, name=None, depth=None):
+    """Mesh of the pie menu primitive at idx, sized like the add operators"""
+    bm = bmesh.new()
+    uv_layer = bm.loops.layers.uv.new("UVMap")
+    radius = size / 2
+    # cylinders and cones are half as deep as they are wide unless told otherwise
+    if depth is None:
+        depth = size / 2
+    if idx == 0:
+        bmesh.ops.create_grid(
+            bm, x_segments=1, y_segments=1, size=radius, calc_uvs=True
+        )
+    elif idx == 1:
+        bmesh.ops.create_cube(bm, size=size, calc_uvs=True)
+    elif idx == 2:
+        bmesh.ops.create_circle(
+            bm, segments=32, calc_uvs=True, **radius_args("radius", value=radius)
+        )
+    elif idx == 3:
+        bmesh.ops.create_uvsphere(
+            bm,
+            u_segments=32,
+            v_segments=16,
+            calc_uvs=True,
+            **radius_args("radius", value=radius),
+        )
+    elif idx == 4:
+        bmesh.ops.create_icosphere(
+            bm, subdivisions=2, calc_uvs=True, **radius_args("radius", value=radius)
+        )
+    elif idx == 5:
+        bmesh.ops.create_cone(
+            bm,
+            cap_ends=True,
+            segments=32,
+            depth=depth,
+            calc_uvs=True,
+            **radius_args("radius1", "radius2", value=radius),
+        )
+    elif idx == 6:
+        bmesh.ops.create_cone(
+            bm,
+            cap_ends=True,
+            segments=32,
+            depth=depth,
+            calc_uvs=True,
+            **radius_args("radius1", value=radius),
+            **radius_args("radius2", value=0),
+        )
+    elif idx == 7:
+        create_torus(bm, radius, size / 4, uv_layer)
+
+    # the add operators leave all of the new geometry selected
+    for v in bm.verts:
+        v.select = True
+    bm.select_flush(True)
+
+    mesh = bpy.data.meshes.new(name or NAMES[idx])
+    bm.to_mesh(mesh)
+    bm.free()
+    return mesh
+
+
+def add_object(
+    context, name, mesh, location, rotation, scale, select=True, collection=None
+):
+    """Link a new object like the add operators do: selected, active, alone"""
+    obj = bpy.data.objects.new(name, mesh)
+    obj.location = location
+    obj.rotation_euler = rotation
+    obj.scale = scale
+    (collection or context.collection).objects.link(obj)
+    if select:
+        for o in context.selected_objects:
+            o.select_set(False)
+        obj.select_set(True)
+        context.view_layer.objects.active = obj
+    return obj
+
+
+def add_primitive(
+    context,
+    idx,
+    size,
+    location,
+    rotation,
+    scale,
+    select=True,
+    depth=None,
+    collection=None,
+):
+    """Add a primitive object, on a shared unit mesh if the preference is on"""
+    prefs = context.preferences.addons[__package__].preferences
+    # objects added to a collection are named after it, like moved ones
+    name = NAMES[idx] if collection is None else collection.name
+    if not prefs.share_meshes:
+        mesh = build_mesh(idx, size, depth=depth)
+        return add_object(
+            context, name, mesh, location, rotation, scale, select, collection
+        )
+    mesh = instancing.shared_mesh(idx)
+    scale = Vector(scale) * size
+    if depth is not None and idx in DEPTH_TYPES and size > 0:
+        # the unit mesh has the default depth of half its size
+        scale.z *= depth / (size / 2)
+    obj = add_object(context, name, mesh, location, rotation, scale, select, collection)
+    obj["polyblocker_size"] = size
+    return obj
+
+
+def add_primitives(context, idx, sizes, locations, rotations, scales, collection=None):
+    """Add many primitive objects at once, the selection is left alone"""
+    prefs = context.preferences.addons[__package__].preferences
+    share = prefs.share_meshes
+    name = NAMES[idx] if collection is None else collection.name
+    if share:
+        mesh = instancing.shared_mesh(idx)
+    else:
+        # build once, copies are much faster than running bmesh ops again
+        unit = build_mesh(idx, 1)
+    objs = []
+    for size, location, rotation, scale in zip(sizes, locations, rotations, scales):
+        if share:
+            scale = Vector(scale) * size
+        else:
+            mesh = unit.copy()
+            mesh.transform(Matrix.Scale(size, 4))
+        obj = add_object(
+            context, name, mesh, location, rotation, scale, False, collection
+        )
+        if share:
+            obj["polyblocker_size"] = size
+        objs.append(obj)
+    if not share:
+        bpy.data.meshes.remove(unit)
+    return objs
+
+
+class AddPrimitive:
+    """Implementation of polyblocker.add_primitive"""
+
+    def execute(self, context):
+        location = context.scene.cursor.location
+        if self.properties.is_property_set("location"):
+            location = self.location
+        # a depth of 0 keeps the default of half the size
+        depth = self.depth or None
+        scale = self.scale
+        add_primitive(
+            context, self.idx, self.size, location, self.rotation, scale, depth=depth
+        )
+        return {"FINISHED"}
+
+
+def fit_primitives(context, idx, objs):
+    """Add a primitive fitted to the bounds of every object, sizes share meshes"""
+    prefs = context.preferences.addons[__package__].preferences
+    share = prefs.share_meshes
+    unit = instancing.shared_mesh(idx) if share else build_mesh(idx, 1)
+    unit_co = np.empty(len(unit.vertices) * 3)
+    unit.vertices.foreach_get("co", unit_co)
+    unit_co = unit_co.reshape(-1, 3)
+    unit_center = (unit_co.min(axis=0) + unit_co.max(axis=0)) / 2
+    unit_dims = unit_co.max(axis=0) - unit_co.min(axis=0)
+
+    # local bounds of every object, read in one go
+    corners = np.array([o.bound_box for o in objs]).reshape(-1, 8, 3)
+    low = corners.min(axis=1)
+    high = corners.max(axis=1)
+    centers = (low + high) / 2
+    # flat objects keep a sliver of depth, a zero scale can't be inverted
+    dims = np.maximum(high - low, 1e-4)
+    factors = np.where(unit_dims > 0, dims / np.where(unit_dims > 0, unit_dims, 1), 1)
+
+    meshes = {}
+    new_objs = []
+    for obj, center, factor in zip(objs, centers, factors):
+        fit = Matrix.Diagonal(factor.tolist()).to_4x4() @ Matrix.Translation(
+            Vector(-unit_center)
+        )
+        if share:
+            mesh = unit
+            matrix = obj.matrix_world @ Matrix.Translation(Vector(center)) @ fit
+        else:
+            # equal sizes use the same mesh
+            key = tuple(np.round(factor, 4))
+            mesh = meshes.get(key)
+            if mesh is None:
+                mesh = unit.copy()
+                mesh.transform(fit)
+                meshes[key] = mesh
+            matrix = obj.matrix_world @ Matrix.Translation(Vector(center))
+        new_obj = bpy.data.objects.new(f"{obj.name}_{NAMES[idx]}", mesh)
+        new_obj.matrix_world = matrix
+        new_objs.append(new_obj)
+    if not share:
+        bpy.data.meshes.remove(unit)
+
+    collection = context.collection
+    for new_obj in new_objs:
+        collection.objects.link(new_obj)
+    return new_objs
+
+
+class FitPrimitives:
+    """Implementation of polyblocker.fit_primitives"""
+
+    def execute(self, context):
+        objs = [o for o in context.selected_objects if o.type in BOUNDED_TYPES]
+        if not objs:
+            self.report({"ERROR"}, "No objects with geometry selected")
+            return {"CANCELLED"}
+        idx = [name.upper() for name in NAMES].index(self.shape)
+        new_objs = fit_primitives(context, idx, objs)
+
+        # select the new objects, like the add operators
+        for obj in context.selected_objects:
+            obj.select_set(False)
+        for obj in new_objs:
+            obj.select_set(True)
+        context.view_layer.objects.active = new_objs[-1]
+        return {"FINISHED"}
@@ -0,0 +1,176 @@
+# Copyright (C) 2023 Daniel Boxer
+
+import bpy
+import functools
+import io
+import time
+import tracemalloc
+from collections import deque
+
+# samples kept per phase for the percentiles
+MAX_SAMPLES = 10000
+
+enabled = False
+trace_memory = False
+profiler = None
+stats = {}
+depth = 0
+
+
+class PhaseStats:
+    def __init__(self):
+        self.count = 0
+        self.total = 0
+        self.times = deque(maxlen=MAX_SAMPLES)
+        self.memory = deque(maxlen=MAX_SAMPLES)
+
+    def percentile(self, fac):
+        times = sorted(self.times)
+        return times[min(len(times) - 1, int(len(times) * fac))]
+
+
+class Phase:
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        global depth
+        depth += 1
+        if profiler is not None and depth == 1:
+            profiler.enable()
+        if trace_memory:
+            self.start_memory = tracemalloc.get_traced_memory()[0]
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        global depth
+        elapsed = time.perf_counter() - self.start
+        phase_stats = stats.get(self.name)
+        if phase_stats is None:
+            phase_stats = stats[self.name] = PhaseStats()
+        phase_stats.count += 1
+        phase_stats.total += elapsed
+        phase_stats.times.append(elapsed)
+        if trace_memory:
+            memory = tracemalloc.get_traced_memory()[0] - self.start_memory
+            phase_stats.memory.append(memory)
+        depth -= 1
+        if profiler is not None and depth == 0:
+            profiler.disable()
+        return False
+
+
+class NullPhase:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+NULL_PHASE = NullPhase()
+
+
+def phase(name):
+    """Time a named block, does nothing while profiling is off"""
+    if not enabled:
+        return NULL_PHASE
+    return Phase(name)
+
+
+def timed(name):
+    """Time every call of the decorated function as a named phase"""
+
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with Phase(name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+def configure(use_profiling, use_memory=False, use_cprofile=False):
+    global enabled, trace_memory, profiler
+    enabled = use_profiling
+    memory = enabled and use_memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+    elif trace_memory and not memory:
+        tracemalloc.stop()
+    trace_memory = memory
+    if enabled and use_cprofile:
+        if profiler is None:
+            import cProfile
+
+            profiler = cProfile.Profile()
+    else:
+        profiler = None
+
+
+def clear_stats():
+    global profiler
+    stats.clear()
+    if profiler is not None:
+        import cProfile
+
+        profiler = cProfile.Profile()
+
+
+def report():
+    lines = [
+        f"{'phase':<32}{'count':>8}{'p50 ms':>10}{'p99 ms':>10}"
+        f"{'total ms':>12}{'mem KiB':>10}"
+    ]
+    for name in sorted(stats):
+        s = stats[name]
+        memory = ""
+        if s.memory:
+            memory = f"{sum(s.memory) / len(s.memory) / 1024:.1f}"
+        lines.append(
+            f"{name:<32}{s.count:>8}{s.percentile(0.5) * 1000:>10.3f}"
+            f"{s.percentile(0.99) * 1000:>10.3f}{s.total * 1000:>12.1f}{memory:>10}"
+        )
+    if profiler is not None:
+        import pstats
+
+        stream = io.StringIO()
+        try:
+            profile_stats = pstats.Stats(profiler, stream=stream)
+        except TypeError:
+            # nothing has been profiled since it was created or reset
+            pass
+        else:
+            profile_stats.sort_stats("cumulative").print_stats(40)
+            lines.extend(("", stream.getvalue()))
+    return "\n".join(lines)
+
+
+class POLYBLOCKER_OT_dump_profile(bpy.types.Operator):
+    bl_idname = "polyblocker.dump_profile"
+    bl_label = "Dump Profile"
+    bl_description = "Write the recorded operator timings to a file"
+
+    filepath: bpy.props.StringProperty(subtype="FILE_PATH")
+    reset: bpy.props.BoolProperty(name="Reset", description="Clear recorded timings")
+
+    def execute(self, context):
+        # build the report first so a failure doesn't leave an empty file
+        text = report()
+        with open(bpy.path.abspath(self.filepath), "w") as f:
+            f.write(text)
+        if self.reset:
+            clear_stats()
+        self.report({"INFO"}, f"Profile written to {self.filepath}")
+        return {"FINISHED"}
+
+    def invoke(self, context, event):
+        if not self.filepath:
+            self.filepath = "polyblocker_profile.txt"
+        context.window_manager.fileselect_add(self)
+        return {"RUNNING_MODAL"}
@@ -3,28 +3,22 @@
 import bpy
 from mathutils import Vector, Matrix, geometry
 from bpy_extras import view3d_utils
-from . import line_draw
+from . import instancing, line_draw, profiling
+from .scheduler import UpdateScheduler
 
 
-class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
-    bl_idname = "polyblocker.quick_mirror"
-    bl_label = "Quick Mirror"
-    bl_description = "Quick mirror"
-    bl_options = {"UNDO", "BLOCKING"}
+class QuickMirror:
+    """Implementation of polyblocker.quick_mirror"""
 
     axis_map = {0: "X", 1: "Y", 2: "Z"}
 
-    @classmethod
-    def poll(cls, context):
-        obj = context.object
-        return obj is not None and obj.type == "MESH"
-
     def invoke(self, context, event):
         self.input = []
         self.mirror_objs = []
         self.hover_axis = None
         self.holding = False
         self.empty = None
+        self.scheduler = None
 
         prefs = context.preferences.addons[__package__].preferences
         selected = context.selected_objects
@@ -39,6 +33,8 @@ class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
                 context.scene.collection.objects.link(target)
             else:
                 target = None
+                # moving the origin of a shared primitive would move every instance
+                instancing.make_single_users(selected)
                 for obj in selected:
                     # set origin to 0
                     mw = obj.matrix_world
@@ -99,52 +95,60 @@ class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
             "Left Click/Hold: Select Axes and Confirm     Right Click/Esc: Cancel"
             "     Scroll Up: Remove Axis"
         )
+        self.scheduler = UpdateScheduler(context, prefs.update_rate)
         context.window_manager.modal_handler_add(self)
         return {"RUNNING_MODAL"}
 
     def modal(self, context, event):
         try:
             if event.type == "MOUSEMOVE":
-                m_pos = Vector((event.mouse_region_x, event.mouse_region_y))
-                
-                # find closest axis to mouse
-                min_dist = float("inf")
-                axis = None
-                for a in range(3):
-                    l1, l2 = self.axis_lines_2d[a]
-                    inter = geometry.intersect_point_line(m_pos, l1, l2)[0] - m_pos
-                    dist = inter.length
-                    if dist < min_dist:
-                        min_dist = dist
-                        axis = self.axis_map[a]
-
-                old_axis = self.hover_axis
-                if old_axis != axis:
-                    # remove mirror preview or if dragging backwards
-                    if not self.holding or axis in self.input:
-                        self.remove(context)
-
-                    line_draw.draw_axis(axis, (1, 1, 1, 1))
-                    self.redraw_v3d(context)
-                    self.add(context, axis)
-                    self.hover_axis = axis
-
+                # axes passed while holding are recorded on every event, only
+                # applying them waits for the scheduler
+                self.mouse_pos = Vector((event.mouse_region_x, event.mouse_region_y))
+                self.hover(context)
             elif event.type == "WHEELDOWNMOUSE" and event.value == "PRESS":
                 self.remove(context)
             elif event.type == "LEFTMOUSE" and event.value == "PRESS":
                 self.holding = True
             elif event.type == "LEFTMOUSE" and event.value == "RELEASE":
+                # apply the latest axes before confirming
+                self.scheduler.flush(self.update, context, force=True)
                 self.finish(context)
                 return {"FINISHED"}
             elif event.type in {"RIGHTMOUSE", "ESC"}:
                 self.finish(context, revert=True)
                 return {"FINISHED"}
+            self.scheduler.flush(self.update, context)
         except Exception as e:
             self.report({"ERROR"}, f"Error: {str(e)}")
             self.finish(context, revert=True)
             return {"CANCELLED"}
         return {"RUNNING_MODAL"}
 
+    @profiling.timed("quick_mirror.hover")
+    def hover(self, context):
+        # find closest axis to mouse
+        min_dist = float("inf")
+        axis = None
+        for a in range(3):
+            l1, l2 = self.axis_lines_2d[a]
+            inter = geometry.intersect_point_line(self.mouse_pos, l1, l2)[0]
+            dist = (inter - self.mouse_pos).length
+            if dist < min_dist:
+                min_dist = dist
+                axis = self.axis_map[a]
+
+        old_axis = self.hover_axis
+        if old_axis != axis:
+            # remove mirror preview or if dragging backwards
+            if not self.holding or axis in self.input:
+                self.remove(context)
+
+            line_draw.draw_axis(axis, (1, 1, 1, 1))
+            self.add(context, axis)
+            self.hover_axis = axis
+
+    @profiling.timed("quick_mirror.modifier_toggle")
     def update(self, context):
         axes = [
             True if "X" in self.input else False,
@@ -155,6 +159,7 @@ class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
             m_obj["mod"].use_axis = axes
         s = f"{'X' if axes[0] else ''}{'Y' if axes[1] else ''}{'Z' if axes[2] else ''}"
         context.area.header_text_set(f"Axes: [ {s} ]")
+        self.redraw_v3d(context)
 
     def redraw_v3d(self, context):
         context.view_layer.objects.active = context.view_layer.objects.active
@@ -162,14 +167,14 @@ class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
     def add(self, context, axis):
         if axis not in self.input:
             self.input.append(axis)
-        self.update(context)
+        self.scheduler.request()
 
     def remove(self, context):
         if len(self.input) > 0:
             axis = self.input.pop()
             # set old axis colour
             line_draw.draw_axis(axis, line_draw.COLOURS[axis])
-            self.update(context)
+            self.scheduler.request()
 
     def finish(self, context, revert=False):
         if revert:
@@ -180,6 +185,8 @@ class POLYBLOCKER_OT_quick_mirror(bpy.types.Operator):
         context.area.header_text_set(None)
         context.workspace.status_text_set(None)
         context.window.cursor_modal_restore()
+        if self.scheduler is not None:
+            self.scheduler.remove(context)
         for axis in range(3):
             line_draw.remove(self.axis_map[axis])
         self.redraw_v3d(context)
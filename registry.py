@@ -0,0 +1,109 @@
+# Copyright (C) 2023 Daniel Boxer
+
+# Objects added by Add Mesh and the collection made for them, per target object.
+# Entries hold identifiers instead of live references, so deleted or reloaded
+# data is dropped instead of being looked up again and again, while renamed
+# data is still found
+
+import bpy
+from bpy.app.handlers import persistent
+
+# target identifier to {"objects": [handle], "collection": handle or None}
+entries = {}
+
+
+def ident(data):
+    # session_uid survives renames and undo, older versions only have the pointer
+    uid = getattr(data, "session_uid", None)
+    return uid if uid is not None else data.as_pointer()
+
+
+def handle(data):
+    # the name is only kept for reading the registry while debugging
+    return (data.name, ident(data))
+
+
+def resolve(data_blocks, handles):
+    """Data blocks behind handles, None for the ones that are gone"""
+    # one map per call, so resolving stays linear however many handles there are
+    by_ident = {ident(d): d for d in data_blocks}
+    return [by_ident.get(key) for name, key in handles]
+
+
+def add(target, objs):
+    """Track objs for target, returns how many were tracked before"""
+    # only appends, dead handles are dropped when the objects are next resolved
+    entry = entries.setdefault(ident(target), {"objects": [], "collection": None})
+    before = len(entry["objects"])
+    entry["objects"].extend(handle(o) for o in objs)
+    return before
+
+
+def count(target):
+    """How many objects are tracked for target, dead ones until they are dropped"""
+    entry = entries.get(ident(target))
+    return 0 if entry is None else len(entry["objects"])
+
+
+def objects(target):
+    """Live objects added for target, dead ones are dropped"""
+    entry = entries.get(ident(target))
+    if entry is None:
+        return []
+    objs = [o for o in resolve(bpy.data.objects, entry["objects"]) if o is not None]
+    entry["objects"] = [handle(o) for o in objs]
+    return objs
+
+
+def collection(target):
+    """Collection made for target, the entry starts over if it was deleted"""
+    key = ident(target)
+    entry = entries.get(key)
+    if entry is None or entry["collection"] is None:
+        return None
+    coll = resolve(bpy.data.collections, [entry["collection"]])[0]
+    if coll is None:
+        del entries[key]
+    else:
+        entry["collection"] = handle(coll)
+    return coll
+
+
+def set_collection(target, coll):
+    entry = entries.setdefault(ident(target), {"objects": [], "collection": None})
+    entry["collection"] = handle(coll)
+
+
+def evict():
+    """Drop entries of targets that no longer exist and handles of dead objects"""
+    alive = {ident(o) for o in bpy.data.objects}
+    for key in list(entries):
+        if key not in alive:
+            del entries[key]
+        else:
+            objs = entries[key]["objects"]
+            objs[:] = [h for h in objs if h[1] in alive]
+
+
+@persistent
+def load_post(*args):
+    # identifiers of the old file mean nothing now
+    entries.clear()
+
+
+@persistent
+def undo_post(*args):
+    evict()
+
+
+def register():
+    bpy.app.handlers.load_post.append(load_post)
+    bpy.app.handlers.undo_post.append(undo_post)
+    bpy.app.handlers.redo_post.append(undo_post)
+
+
+def unregister():
+    bpy.app.handlers.redo_post.remove(undo_post)
+    bpy.app.handlers.undo_post.remove(undo_post)
+    bpy.app.handlers.load_post.remove(load_post)
+    entries.clear()
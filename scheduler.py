@@ -0,0 +1,33 @@
+# Copyright (C) 2023 Daniel Boxer
+
+import time
+
+
+class UpdateScheduler:
+    """Coalesce modal events so the expensive update runs at most once per interval"""
+
+    def __init__(self, context, rate):
+        # a rate of 0 updates on every event
+        self.interval = 1 / rate if rate > 0 else 0
+        self.pending = False
+        self.last_update = 0
+        # timer events flush updates that were held back
+        self.timer = context.window_manager.event_timer_add(
+            self.interval or 0.1, window=context.window
+        )
+
+    def request(self):
+        self.pending = True
+
+    def is_idle(self):
+        return not self.pending
+
+    def flush(self, callback, *args, force=False):
+        now = time.perf_counter()
+        if self.pending and (force or now - self.last_update >= self.interval):
+            self.pending = False
+            self.last_update = now
+            callback(*args)
+
+    def remove(self, context):
+        context.window_manager.event_timer_remove(self.timer)
@@ -1,6 +1,13 @@
 # Copyright (C) 2023 Daniel Boxer
 
 import bpy
+from . import profiling
+
+
+def update_profiling(self, context):
+    profiling.configure(
+        self.profiling, self.profile_memory, self.profile_mode == "CPROFILE"
+    )
 
 
 def name_and_icon(name):
@@ -20,6 +27,26 @@ def draw_mesh_op(name, menu, location, rotation, scale, set_loc, **kwargs):
         setattr(op, key, value)
 
 
+def draw_shared_op(idx, name, menu, location, rotation, scale, set_loc, size, **kwargs):
+    op = menu.operator("polyblocker.add_primitive", **name_and_icon(name))
+    op.idx = idx
+    op.size = size
+    if set_loc:
+        op.location = location
+    op.rotation = rotation
+    if name != "Torus":
+        op.scale = scale
+    for key, value in kwargs.items():
+        setattr(op, key, value)
+
+
+def draw_object_menu(self, context):
+    self.layout.separator()
+    self.layout.operator_menu_enum(
+        "polyblocker.fit_primitives", "shape", text="Fit Primitives", icon="MESH_CUBE"
+    )
+
+
 class POLYBLOCKER_MT_pie(bpy.types.Menu):
     bl_label = "PolyBlocker"
 
@@ -50,6 +77,17 @@ class POLYBLOCKER_MT_pie(bpy.types.Menu):
                 scale = selected.scale
 
             args = (pie, location, rotation, scale, set_loc)
+            if context.preferences.addons[__package__].preferences.share_meshes:
+                # same sizes as the add operators give below
+                draw_shared_op(0, "Plane", *args, size)
+                draw_shared_op(1, "Cube", *args, 2)
+                draw_shared_op(2, "Circle", *args, size)
+                draw_shared_op(3, "UV Sphere", *args, 2)
+                draw_shared_op(4, "Ico Sphere", *args, 2)
+                draw_shared_op(5, "Cylinder", *args, 2, depth=2)
+                draw_shared_op(6, "Cone", *args, 2, depth=2)
+                draw_shared_op(7, "Torus", *args, size)
+                return
             draw_mesh_op("Plane", *args, size=size)
             draw_mesh_op("Cube", *args)
             draw_mesh_op("Circle", *args, radius=size / 2)
@@ -71,10 +109,42 @@ class POLYBLOCKER_AP_preferences(bpy.types.AddonPreferences):
     obj_number: bpy.props.IntProperty(
         name="Number", description="", min=1, max=10, default=3
     )
+    share_meshes: bpy.props.BoolProperty(
+        name="Share Meshes",
+        description="Add primitives as instances of shared unit meshes, "
+        "objects get their own mesh when they are edited",
+    )
     # quick mirror
     origin_method: bpy.props.EnumProperty(
         items=[("EMPTY", "Empty", ""), ("ORIGIN", "Set Origin", "")]
     )
+    # cap tool and quick mirror
+    update_rate: bpy.props.IntProperty(
+        name="Update Rate",
+        description="Maximum updates per second while dragging (0 updates on every event)",
+        min=0,
+        max=240,
+        default=60,
+    )
+    # profiling
+    profiling: bpy.props.BoolProperty(
+        name="Profiling",
+        description="Record timings of operator phases",
+        update=update_profiling,
+    )
+    profile_memory: bpy.props.BoolProperty(
+        name="Track Memory",
+        description="Record memory allocated in each phase, this slows operators down",
+        update=update_profiling,
+    )
+    profile_mode: bpy.props.EnumProperty(
+        name="Mode",
+        items=[
+            ("TIMING", "Timing", "Only record phase timings"),
+            ("CPROFILE", "cProfile", "Also capture a cProfile of every phase"),
+        ],
+        update=update_profiling,
+    )
 
     def draw(self, context):
         layout = self.layout
@@ -84,8 +154,23 @@ class POLYBLOCKER_AP_preferences(bpy.types.AddonPreferences):
         row.prop(self, "auto_coll")
         if self.auto_coll:
             row.prop(self, "obj_number")
+        row = box.row()
+        row.prop(self, "share_meshes")
         box = layout.box()
         box.label(text="Quick Mirror")
         row = box.row()
         row.label(text="Origin Method")
         row.prop(self, "origin_method", expand=True)
+        box = layout.box()
+        box.label(text="Cap Tool and Quick Mirror")
+        row = box.row()
+        row.prop(self, "update_rate")
+        box = layout.box()
+        box.label(text="Profiling")
+        row = box.row()
+        row.prop(self, "profiling")
+        if self.profiling:
+            row.prop(self, "profile_memory")
+            row = box.row()
+            row.prop(self, "profile_mode", expand=True)
+            box.operator("polyblocker.dump_profile")